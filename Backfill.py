@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import uuid
+import socket
+import logging
+import argparse
+import multiprocessing
+import mysql.connector
+from ETH_Deposit_Tracker import DepositTracker, DB_CONFIG, rpc
+from Block_Range_Index import load_ranges
+
+logger = logging.getLogger(__name__)
+
+# Block the Beacon Deposit Contract was deployed in; nothing to index before it
+DEPOSIT_CONTRACT_DEPLOY_BLOCK = 11052984
+
+# Blocks per leased chunk; chunk boundaries are aligned to multiples of this so every
+# host seeding the same range creates the same chunks
+BACKFILL_CHUNK_SIZE = int(os.getenv('BACKFILL_CHUNK_SIZE', '10000'))
+# A lease not renewed for this long is considered abandoned and can be claimed by another worker
+BACKFILL_LEASE_SECONDS = int(os.getenv('BACKFILL_LEASE_SECONDS', '300'))
+# Blocks ingested between lease renewals and progress reports
+BACKFILL_SLICE_SIZE = int(os.getenv('BACKFILL_SLICE_SIZE', '1000'))
+# Seconds to wait before looking again when every remaining chunk is leased by someone else
+BACKFILL_IDLE_DELAY = 30
+
+
+class BackfillLeases:
+    # Chunks of the backfill range in Backfill_Leases, claimed with an atomic
+    # UPDATE ... LIMIT 1 that also takes over leases whose holder stopped renewing them
+    def __init__(self, db):
+        self.db = db
+        self.cursor = db.cursor()
+
+    def create_table(self):
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Backfill_Leases (
+                chunk_start INT PRIMARY KEY,
+                chunk_end INT NOT NULL,
+                status ENUM('pending', 'leased', 'done') DEFAULT 'pending',
+                worker_id VARCHAR(255),
+                lease_token CHAR(32),
+                lease_expires DATETIME,
+                progress_block INT,
+                blocks_per_second DOUBLE,
+                attempts INT DEFAULT 0,
+                updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX (status, lease_expires),
+                UNIQUE INDEX (lease_token)
+            )
+        ''')
+        self.db.commit()
+
+    def seed(self, start_block, end_block, chunk_size):
+        # Idempotent: existing chunks are kept, and a chunk extended past its old end is reopened
+        chunks = []
+        for chunk_start in range(start_block - start_block % chunk_size, end_block + 1, chunk_size):
+            chunks.append((max(chunk_start, start_block), min(chunk_start + chunk_size - 1, end_block)))
+        self.cursor.executemany('''
+            INSERT INTO Backfill_Leases (chunk_start, chunk_end) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE
+                status = IF(VALUES(chunk_end) > chunk_end, 'pending', status),
+                chunk_end = GREATEST(chunk_end, VALUES(chunk_end))
+        ''', chunks)
+        self.db.commit()
+        return len(chunks)
+
+    def claim(self, worker_id, lease_seconds):
+        token = uuid.uuid4().hex
+        self.cursor.execute('''
+            UPDATE Backfill_Leases
+            SET status = 'leased', worker_id = %s, lease_token = %s,
+                lease_expires = NOW() + INTERVAL %s SECOND, attempts = attempts + 1
+            WHERE status = 'pending' OR (status = 'leased' AND lease_expires < NOW())
+            ORDER BY chunk_start
+            LIMIT 1
+        ''', (worker_id, token, lease_seconds))
+        self.db.commit()
+        if self.cursor.rowcount == 0:
+            return None
+        self.cursor.execute('SELECT chunk_start, chunk_end, attempts FROM Backfill_Leases WHERE lease_token = %s', (token,))
+        chunk_start, chunk_end, attempts = self.cursor.fetchone()
+        return token, chunk_start, chunk_end, attempts
+
+    def renew(self, token, lease_seconds, progress_block, blocks_per_second):
+        # Returns False when the lease expired and was taken over, so the holder must stop
+        self.cursor.execute('''
+            UPDATE Backfill_Leases
+            SET lease_expires = NOW() + INTERVAL %s SECOND, progress_block = %s, blocks_per_second = %s
+            WHERE lease_token = %s AND status = 'leased'
+        ''', (lease_seconds, progress_block, blocks_per_second, token))
+        self.db.commit()
+        return self.cursor.rowcount == 1
+
+    def complete(self, token, blocks_per_second):
+        self.cursor.execute('''
+            UPDATE Backfill_Leases
+            SET status = 'done', progress_block = chunk_end, blocks_per_second = %s, lease_expires = NULL
+            WHERE lease_token = %s AND status = 'leased'
+        ''', (blocks_per_second, token))
+        self.db.commit()
+        return self.cursor.rowcount == 1
+
+    def remaining(self):
+        self.cursor.execute("SELECT COUNT(*) FROM Backfill_Leases WHERE status != 'done'")
+        count = self.cursor.fetchone()[0]
+        self.db.commit()
+        return count
+
+    def status(self):
+        self.cursor.execute('''
+            SELECT status, COUNT(*), SUM(chunk_end - chunk_start + 1),
+                   SUM(COALESCE(progress_block, chunk_start - 1) - chunk_start + 1)
+            FROM Backfill_Leases GROUP BY status
+        ''')
+        totals = self.cursor.fetchall()
+        self.cursor.execute('''
+            SELECT worker_id, chunk_start, chunk_end, progress_block, blocks_per_second,
+                   lease_expires < NOW() AS expired
+            FROM Backfill_Leases WHERE status = 'leased' ORDER BY worker_id
+        ''')
+        workers = self.cursor.fetchall()
+        self.db.commit()
+        return totals, workers
+
+
+def backfill_chunk(tracker, leases, token, chunk_start, chunk_end, worker_id):
+    # Ingests only the parts of the chunk that no process has recorded yet, renewing the lease
+    # after every slice. Returns False if the lease was lost or ingestion stopped early.
+    tracker.db.commit()  # End any open read snapshot so ranges committed by other workers are visible
+    load_ranges(tracker.cursor, tracker.processed_ranges)
+    gaps = tracker.processed_ranges.gaps(chunk_start, chunk_end) if len(tracker.processed_ranges) else [(chunk_start, chunk_end)]
+    total = sum(end - start + 1 for start, end in gaps)
+    done = 0
+    started = time.monotonic()
+    for gap_start, gap_end in gaps:
+        for slice_start in range(gap_start, gap_end + 1, BACKFILL_SLICE_SIZE):
+            slice_end = min(slice_start + BACKFILL_SLICE_SIZE - 1, gap_end)
+            last_block = tracker.catch_up(slice_start, slice_end)
+            done += max(0, last_block - slice_start + 1)
+            blocks_per_second = done / (time.monotonic() - started)
+            if last_block < slice_end:
+                logger.error(f"Worker {worker_id} stopped at block {last_block + 1} in chunk {chunk_start}-{chunk_end}, "
+                             f"leaving the lease to expire for a retry")
+                return False
+            if not leases.renew(token, BACKFILL_LEASE_SECONDS, slice_end, blocks_per_second):
+                logger.error(f"Worker {worker_id} lost the lease on chunk {chunk_start}-{chunk_end}")
+                return False
+            logger.info(f"Worker {worker_id} chunk {chunk_start}-{chunk_end}: {done}/{total} blocks "
+                        f"at {blocks_per_second:.1f} blocks/sec")
+    elapsed = time.monotonic() - started
+    return leases.complete(token, done / elapsed if elapsed else 0.0)
+
+
+def run_worker(worker_id):
+    tracker = DepositTracker()
+    leases = BackfillLeases(mysql.connector.connect(**DB_CONFIG))
+    blocks_done = 0
+    started = time.monotonic()
+    while True:
+        try:
+            lease = leases.claim(worker_id, BACKFILL_LEASE_SECONDS)
+            if lease is None:
+                if leases.remaining() == 0:
+                    break
+                # Everything left is leased by live workers; wait in case one of them dies
+                time.sleep(BACKFILL_IDLE_DELAY)
+                continue
+            token, chunk_start, chunk_end, attempts = lease
+            if attempts > 1:
+                logger.warning(f"Worker {worker_id} reclaimed chunk {chunk_start}-{chunk_end} (attempt {attempts})")
+            if backfill_chunk(tracker, leases, token, chunk_start, chunk_end, worker_id):
+                blocks_done += chunk_end - chunk_start + 1
+        except Exception as e:
+            logger.error(f"Worker {worker_id} error: {e}")
+            time.sleep(BACKFILL_IDLE_DELAY)
+    elapsed = time.monotonic() - started
+    logger.info(f"Worker {worker_id} finished: {blocks_done} blocks in {elapsed:.0f}s "
+                f"({blocks_done / elapsed if elapsed else 0.0:.1f} blocks/sec)")
+
+
+def print_status(leases):
+    totals, workers = leases.status()
+    for status, chunks, blocks, progressed in totals:
+        print(f"{status}: {chunks} chunks, {blocks} blocks ({progressed} ingested)")
+    for worker_id, chunk_start, chunk_end, progress_block, blocks_per_second, expired in workers:
+        state = 'expired' if expired else 'active'
+        print(f"{worker_id}: chunk {chunk_start}-{chunk_end} at block {progress_block or chunk_start - 1}, "
+              f"{blocks_per_second or 0.0:.1f} blocks/sec ({state})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill historical deposits with leased chunks across worker processes')
+    parser.add_argument('--start', type=int, help='first block to backfill (default: deposit contract deployment)')
+    parser.add_argument('--end', type=int, help='last block to backfill (default: block before the first processed one)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes on this host')
+    parser.add_argument('--seed-only', action='store_true', help='create the chunks without starting workers')
+    parser.add_argument('--status', action='store_true', help='print progress and exit')
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    leases = BackfillLeases(db)
+    leases.create_table()
+    if args.status:
+        print_status(leases)
+        return
+
+    if args.start is not None or args.end is not None or leases.remaining() == 0:
+        start_block = args.start if args.start is not None else DEPOSIT_CONTRACT_DEPLOY_BLOCK
+        end_block = args.end
+        if end_block is None:
+            first_block = load_ranges(db.cursor()).first_block()
+            end_block = first_block - 1 if first_block is not None else rpc.get_block_number()
+        if start_block <= end_block:
+            chunks = leases.seed(start_block, end_block, BACKFILL_CHUNK_SIZE)
+            logger.info(f"Seeded {chunks} chunks covering blocks {start_block}-{end_block}")
+    if args.seed_only:
+        return
+
+    # Spawned rather than forked so each worker starts with its own connections and thread pools
+    context = multiprocessing.get_context('spawn')
+    host = socket.gethostname()
+    workers = [context.Process(target=run_worker, args=(f"{host}-{os.getpid()}-{i}",)) for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    print_status(leases)
+    sys.exit(0 if all(worker.exitcode == 0 for worker in workers) else 1)
+
+
+if __name__ == "__main__":
+    main()
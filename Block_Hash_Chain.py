@@ -0,0 +1,37 @@
+from collections import OrderedDict
+
+
+class BlockHashChain:
+    # Ring buffer of (block_hash, parent_hash) for the most recent processed blocks
+    def __init__(self, depth=64):
+        self.depth = depth
+        self.blocks = OrderedDict()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def add(self, block_number, block_hash, parent_hash):
+        self.truncate(block_number - 1)
+        self.blocks[block_number] = (block_hash, parent_hash)
+        while len(self.blocks) > self.depth:
+            self.blocks.popitem(last=False)
+
+    def latest(self):
+        return next(reversed(self.blocks)) if self.blocks else None
+
+    def get_hash(self, block_number):
+        entry = self.blocks.get(block_number)
+        return entry[0] if entry else None
+
+    def links(self, block_number, parent_hash):
+        # Unknown parents are accepted: only a known, different parent hash proves a fork
+        known_parent = self.get_hash(block_number - 1)
+        return known_parent is None or known_parent == parent_hash
+
+    def truncate(self, block_number):
+        # Forgets every block above block_number
+        while self.blocks and next(reversed(self.blocks)) > block_number:
+            self.blocks.popitem(last=True)
+
+    def block_numbers(self):
+        return list(reversed(self.blocks))
@@ -0,0 +1,65 @@
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BlockPipeline:
+    # Three stages: fetch and decode run concurrently on a thread pool, persist runs
+    # on the calling thread strictly in block order so the watermark never skips ahead
+    def __init__(self, fetch, decode, persist, workers=8, chunk_size=1, max_in_flight=None):
+        self.fetch = fetch
+        self.decode = decode
+        self.persist = persist
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or workers * 2
+        self.blocks_processed = 0
+        self.elapsed = 0.0
+
+    @property
+    def blocks_per_second(self):
+        return self.blocks_processed / self.elapsed if self.elapsed else 0.0
+
+    def fetch_and_decode(self, start_block, end_block):
+        return self.decode(self.fetch(start_block, end_block))
+
+    def chunks(self, start_block, end_block):
+        for chunk_start in range(start_block, end_block + 1, self.chunk_size):
+            yield chunk_start, min(chunk_start + self.chunk_size - 1, end_block)
+
+    def run(self, start_block, end_block):
+        # Returns the last block that was persisted
+        last_block = start_block - 1
+        started = time.monotonic()
+        pending = deque()
+        chunks = self.chunks(start_block, end_block)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            def submit_next():
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append((chunk, executor.submit(self.fetch_and_decode, *chunk)))
+
+            for _ in range(self.max_in_flight):
+                submit_next()
+
+            try:
+                while pending:
+                    (chunk_start, chunk_end), future = pending.popleft()
+                    items = future.result()
+                    submit_next()
+                    self.persist(chunk_start, chunk_end, items)
+                    last_block = chunk_end
+            except Exception as e:
+                logger.error(f"Pipeline stopped at block {last_block + 1}: {e}")
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+        self.blocks_processed += last_block - start_block + 1
+        self.elapsed += time.monotonic() - started
+        logger.info(f"Pipeline processed blocks {start_block}-{last_block} at {self.blocks_per_second:.1f} blocks/sec")
+        return last_block
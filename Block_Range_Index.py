@@ -0,0 +1,108 @@
+import bisect
+
+
+class BlockRangeIndex:
+    # Sorted, non-overlapping, non-adjacent [start, end] ranges of processed blocks
+    def __init__(self, ranges=()):
+        self.reset(ranges)
+
+    def reset(self, ranges):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(ranges):
+            self.add(start, end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def ranges(self):
+        return list(zip(self.starts, self.ends))
+
+    def first_block(self):
+        return self.starts[0] if self.starts else None
+
+    def last_block(self):
+        return self.ends[-1] if self.ends else None
+
+    def contains(self, block_number):
+        i = bisect.bisect_right(self.starts, block_number) - 1
+        return i >= 0 and self.ends[i] >= block_number
+
+    def overlapping(self, start, end):
+        # Indexes of ranges that overlap or touch [start, end]
+        lo = bisect.bisect_left(self.ends, start - 1)
+        hi = bisect.bisect_right(self.starts, end + 1)
+        return lo, hi
+
+    def merged(self, start, end):
+        # Returns the range [start, end] would become part of, plus the ranges it replaces
+        lo, hi = self.overlapping(start, end)
+        replaced = list(zip(self.starts[lo:hi], self.ends[lo:hi]))
+        if replaced:
+            start = min(start, replaced[0][0])
+            end = max(end, replaced[-1][1])
+        return (start, end), replaced
+
+    def add(self, start, end):
+        (start, end), _ = self.merged(start, end)
+        lo, hi = self.overlapping(start, end)
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+        return start, end
+
+    def truncate(self, block_number):
+        # Forgets every block above block_number
+        i = bisect.bisect_right(self.starts, block_number)
+        del self.starts[i:]
+        del self.ends[i:]
+        if self.ends and self.ends[-1] > block_number:
+            self.ends[-1] = block_number
+
+    def gaps(self, start=None, end=None):
+        # Missing [start, end] ranges between start (default: first block) and end (default: last block)
+        if not self.starts:
+            return []
+        start = self.starts[0] if start is None else start
+        end = self.ends[-1] if end is None else end
+        missing = []
+        cursor = start
+        lo, hi = self.overlapping(start, end)
+        for range_start, range_end in zip(self.starts[lo:hi], self.ends[lo:hi]):
+            if range_start > cursor:
+                missing.append((cursor, min(range_start - 1, end)))
+            cursor = max(cursor, range_end + 1)
+        if cursor <= end:
+            missing.append((cursor, end))
+        return missing
+
+
+def load_ranges(cursor, index=None):
+    cursor.execute('SELECT start_block, end_block FROM Processed_Ranges ORDER BY start_block')
+    index = index if index is not None else BlockRangeIndex()
+    index.reset(cursor.fetchall())
+    return index
+
+
+def save_range(cursor, index, start, end):
+    # Replaces every stored range that [start, end] touches with the merged range and
+    # updates the index to match; callers reload the index if the transaction is rolled back.
+    # Touching rows are re-read under a lock first, since backfill workers in other processes
+    # write the same table and this process's index may not have seen their ranges yet.
+    cursor.execute('''
+        SELECT start_block, end_block FROM Processed_Ranges
+        WHERE end_block >= %s AND start_block <= %s
+        FOR UPDATE
+    ''', (start - 1, end + 1))
+    for stored_start, stored_end in cursor.fetchall():
+        index.add(stored_start, stored_end)
+    (start, end), replaced = index.merged(start, end)
+    if replaced:
+        cursor.execute('DELETE FROM Processed_Ranges WHERE start_block BETWEEN %s AND %s', (start, end))
+    cursor.execute('INSERT INTO Processed_Ranges (start_block, end_block) VALUES (%s, %s)', (start, end))
+    return index.add(start, end)
+
+
+def truncate_ranges(cursor, index, block_number):
+    cursor.execute('DELETE FROM Processed_Ranges WHERE start_block > %s', (block_number,))
+    cursor.execute('UPDATE Processed_Ranges SET end_block = %s WHERE end_block > %s', (block_number, block_number))
+    index.truncate(block_number)
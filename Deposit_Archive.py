@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import argparse
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.parquet as pq
+import mysql.connector
+from ETH_Deposit_Tracker import DB_CONFIG, create_tables
+from Block_Range_Index import load_ranges, save_range
+from Deposit_Rollups import rebuild_rollups
+from Write_Batcher import INSERT_PROCESSED_BLOCK
+
+logger = logging.getLogger(__name__)
+
+# Rows per exported record batch (one Parquet row group) and per import transaction
+ARCHIVE_CHUNK_SIZE = int(os.getenv('ARCHIVE_CHUNK_SIZE', '50000'))
+# Rows per multi-row INSERT while importing, keeping statements well under max_allowed_packet
+IMPORT_INSERT_ROWS = int(os.getenv('IMPORT_INSERT_ROWS', '5000'))
+# Codec for Parquet pages and Arrow IPC buffers
+ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'zstd')
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Hashes, keys and signatures are fixed-size binary and fees are decimals instead of hex and digit strings
+DEPOSITS_SCHEMA = pa.schema([
+    ('blockNumber', pa.int64()),
+    ('blockTimestamp', pa.int64()),
+    ('fee', pa.decimal128(38, 0)),
+    ('hash', pa.binary(32)),
+    ('logIndex', pa.int32()),
+    ('pubkey', pa.binary(48)),
+    ('withdrawal_credentials', pa.binary(32)),
+    ('amount_gwei', pa.uint64()),
+    ('signature', pa.binary(96)),
+    ('deposit_index', pa.uint64()),
+    ('status', pa.string()),
+])
+
+RANGES_SCHEMA = pa.schema([
+    ('start_block', pa.int64()),
+    ('end_block', pa.int64()),
+])
+
+BLOCKS_SCHEMA = pa.schema([
+    ('block_number', pa.int64()),
+    ('block_hash', pa.binary(32)),
+    ('parent_hash', pa.binary(32)),
+])
+
+# Exported tables, each read in chunks ordered by its key column
+TABLES = {
+    'Deposits': ('id', DEPOSITS_SCHEMA),
+    'Processed_Blocks': ('block_number', BLOCKS_SCHEMA),
+    'Processed_Ranges': ('start_block', RANGES_SCHEMA),
+}
+
+INSERT_DEPOSIT_ROW = f'''
+    INSERT INTO Deposits ({', '.join(DEPOSITS_SCHEMA.names)})
+    VALUES ({', '.join(['%s'] * len(DEPOSITS_SCHEMA))})
+    ON DUPLICATE KEY UPDATE
+        {', '.join(f'{name} = VALUES({name})' for name in DEPOSITS_SCHEMA.names if name not in ('hash', 'logIndex'))}
+'''
+
+
+def table_path(directory, table, file_format):
+    return os.path.join(directory, table + FORMATS[file_format])
+
+
+def from_hex(value):
+    if value is None:
+        return None
+    return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+
+
+def to_batch(columns, schema):
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_fixed_size_binary(field.type):
+            values = [from_hex(value) for value in values]
+        elif pa.types.is_decimal(field.type):
+            values = [None if value is None else Decimal(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def to_rows(batch):
+    columns = []
+    for field, column in zip(batch.schema, batch.columns):
+        values = column.to_pylist()
+        if pa.types.is_fixed_size_binary(field.type):
+            values = [None if value is None else '0x' + value.hex() for value in values]
+        elif pa.types.is_decimal(field.type):
+            values = [None if value is None else str(int(value)) for value in values]
+        columns.append(values)
+    return list(zip(*columns))
+
+
+def open_writer(path, schema, file_format):
+    # Both writers take record batches; every Parquet batch becomes its own row group
+    if file_format == 'parquet':
+        return pq.ParquetWriter(path, schema, compression=ARCHIVE_COMPRESSION)
+    return pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=ARCHIVE_COMPRESSION))
+
+
+def read_batches(path, schema, chunk_size):
+    # Files are memory-mapped, so only the batch being imported is decoded into memory
+    if path.endswith(FORMATS['parquet']):
+        parquet = pq.ParquetFile(path, memory_map=True)
+        check_schema(path, parquet.schema_arrow, schema)
+        yield from parquet.iter_batches(batch_size=chunk_size)
+        return
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        check_schema(path, reader.schema, schema)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+
+
+def check_schema(path, found, expected):
+    if not found.equals(expected):
+        raise ValueError(f"{path} has columns {found.names}, expected {expected.names}")
+
+
+def export_table(cursor, table, path, file_format, chunk_size):
+    key, schema = TABLES[table]
+    writer = open_writer(path, schema, file_format)
+    rows_written = 0
+    last_key = -1
+    try:
+        while True:
+            cursor.execute(f'''
+                SELECT {key}, {', '.join(schema.names)} FROM {table}
+                WHERE {key} > %s
+                ORDER BY {key}
+                LIMIT %s
+            ''', (last_key, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_key = rows[-1][0]
+            writer.write_batch(to_batch(list(zip(*rows))[1:], schema))
+            rows_written += len(rows)
+    finally:
+        writer.close()
+    return rows_written
+
+
+def export_archive(directory, file_format='parquet', chunk_size=ARCHIVE_CHUNK_SIZE):
+    # mysql-connector leaves autocommit off, so under InnoDB's default REPEATABLE READ every
+    # chunk reads from the snapshot the first SELECT opened and the files agree with each other
+    os.makedirs(directory, exist_ok=True)
+    db = mysql.connector.connect(**DB_CONFIG)
+    cursor = db.cursor()
+    try:
+        for table in TABLES:
+            started = time.monotonic()
+            path = table_path(directory, table, file_format)
+            rows = export_table(cursor, table, path, file_format, chunk_size)
+            elapsed = time.monotonic() - started
+            logger.info(f"Exported {rows} {table} rows to {path} ({os.path.getsize(path)} bytes) in {elapsed:.1f}s "
+                        f"({rows / elapsed if elapsed else 0.0:.0f} rows/sec)")
+        db.commit()
+    finally:
+        cursor.close()
+        db.close()
+
+
+def find_format(directory):
+    for file_format in FORMATS:
+        if all(os.path.exists(table_path(directory, table, file_format)) for table in TABLES):
+            return file_format
+    raise FileNotFoundError(f"No complete Parquet or Arrow archive of {', '.join(TABLES)} in {directory}")
+
+
+def import_rows(db, cursor, statement, path, schema, chunk_size):
+    rows_imported = 0
+    started = time.monotonic()
+    for batch in read_batches(path, schema, chunk_size):
+        rows = to_rows(batch)
+        for i in range(0, len(rows), IMPORT_INSERT_ROWS):
+            cursor.executemany(statement, rows[i:i + IMPORT_INSERT_ROWS])
+        db.commit()
+        rows_imported += len(rows)
+        elapsed = time.monotonic() - started
+        logger.info(f"Imported {rows_imported} rows from {path} ({rows_imported / elapsed if elapsed else 0.0:.0f} rows/sec)")
+    return rows_imported
+
+
+def import_archive(directory, chunk_size=ARCHIVE_CHUNK_SIZE):
+    # Deposits are committed chunk by chunk before any processed range, so an interrupted import
+    # leaves no block marked processed without its deposits and can simply be run again.
+    # Rollups are rebuilt at the end; the tracker should not be running meanwhile.
+    file_format = find_format(directory)
+    db = mysql.connector.connect(**DB_CONFIG)
+    cursor = db.cursor()
+    try:
+        create_tables(cursor)
+        db.commit()
+        started = time.monotonic()
+        deposits = import_rows(db, cursor, INSERT_DEPOSIT_ROW, table_path(directory, 'Deposits', file_format),
+                               DEPOSITS_SCHEMA, chunk_size)
+        import_rows(db, cursor, INSERT_PROCESSED_BLOCK, table_path(directory, 'Processed_Blocks', file_format),
+                    BLOCKS_SCHEMA, chunk_size)
+
+        # Ranges are merged with any already stored, then rollups are recomputed, in one transaction
+        try:
+            index = load_ranges(cursor)
+            for batch in read_batches(table_path(directory, 'Processed_Ranges', file_format), RANGES_SCHEMA, chunk_size):
+                for start_block, end_block in to_rows(batch):
+                    save_range(cursor, index, start_block, end_block)
+            rebuild_rollups(cursor)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info(f"Imported {deposits} deposits and {len(index)} processed ranges up to block "
+                    f"{index.last_block()} in {time.monotonic() - started:.1f}s")
+    finally:
+        cursor.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or import deposit history as compressed columnar files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write Deposits and the processed block state to a directory')
+    export_parser.add_argument('directory')
+    export_parser.add_argument('--format', choices=FORMATS, default='parquet', help='Parquet or Arrow IPC files')
+    export_parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE, help='rows per record batch')
+    import_parser = commands.add_parser('import', help='bulk load an exported directory into the database')
+    import_parser.add_argument('directory')
+    import_parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE, help='rows per transaction')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_archive(args.directory, args.format, args.chunk_size)
+    else:
+        import_archive(args.directory, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
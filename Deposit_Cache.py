@@ -0,0 +1,30 @@
+from collections import OrderedDict
+
+
+class SeenDepositCache:
+    # Bounded LRU of recently persisted (hash, logIndex) keys, remembering each key's block
+    # so entries from orphaned blocks can be dropped on reorg
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, key, block_number):
+        self.keys[key] = block_number
+        self.keys.move_to_end(key)
+        while len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+
+    def forget_after(self, block_number):
+        for key in [key for key, n in self.keys.items() if n > block_number]:
+            del self.keys[key]
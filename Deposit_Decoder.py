@@ -0,0 +1,97 @@
+from eth_abi.abi import decode
+
+# deposit(bytes pubkey, bytes withdrawal_credentials, bytes signature, bytes32 deposit_data_root)
+DEPOSIT_SELECTOR = bytes.fromhex('22895118')
+
+PUBKEY_LENGTH = 48
+WITHDRAWAL_CREDENTIALS_LENGTH = 32
+AMOUNT_LENGTH = 8
+SIGNATURE_LENGTH = 96
+INDEX_LENGTH = 8
+
+# DepositEvent(bytes pubkey, bytes withdrawal_credentials, bytes amount, bytes signature, bytes index)
+# always ABI-encodes to the same layout: five head offsets, then length-prefixed, 32-byte padded fields
+LOG_HEAD = (0xa0, 0x100, 0x140, 0x180, 0x200)
+LOG_LENGTH = 0x240
+LOG_HEAD_BYTES = b''.join(offset.to_bytes(32, 'big') for offset in LOG_HEAD)
+
+# Calldata after the selector: three head offsets and the deposit data root
+CALLDATA_HEAD = (0x80, 0xe0, 0x120)
+CALLDATA_LENGTH = 4 + 0x1a0
+CALLDATA_HEAD_BYTES = b''.join(offset.to_bytes(32, 'big') for offset in CALLDATA_HEAD)
+
+
+def field(view, offset, length):
+    # Returns a zero-copy slice after checking the length prefix written by the ABI encoder
+    if view[offset:offset + 32] != length.to_bytes(32, 'big'):
+        raise ValueError(f"Unexpected field length at offset {offset}")
+    return view[offset + 32:offset + 32 + length]
+
+
+def decode_deposit_log(data):
+    view = memoryview(data)
+    if len(view) != LOG_LENGTH or view[:len(LOG_HEAD_BYTES)] != LOG_HEAD_BYTES:
+        return decode_deposit_log_generic(data)
+
+    return {
+        'pubkey': '0x' + field(view, LOG_HEAD[0], PUBKEY_LENGTH).hex(),
+        'withdrawal_credentials': '0x' + field(view, LOG_HEAD[1], WITHDRAWAL_CREDENTIALS_LENGTH).hex(),
+        # amount and index are little-endian uint64 SSZ encodings
+        'amount_gwei': int.from_bytes(field(view, LOG_HEAD[2], AMOUNT_LENGTH), 'little'),
+        'signature': '0x' + field(view, LOG_HEAD[3], SIGNATURE_LENGTH).hex(),
+        'deposit_index': int.from_bytes(field(view, LOG_HEAD[4], INDEX_LENGTH), 'little'),
+    }
+
+
+def decode_deposit_logs(datas, skip_invalid=False):
+    if not skip_invalid:
+        return [decode_deposit_log(data) for data in datas]
+    decoded = []
+    for data in datas:
+        try:
+            decoded.append(decode_deposit_log(data))
+        except Exception:
+            decoded.append(None)
+    return decoded
+
+
+def decode_deposit_log_generic(data):
+    pubkey, withdrawal_credentials, amount, signature, index = decode(
+        ['bytes', 'bytes', 'bytes', 'bytes', 'bytes'], bytes(data)
+    )
+    return {
+        'pubkey': '0x' + pubkey.hex(),
+        'withdrawal_credentials': '0x' + withdrawal_credentials.hex(),
+        'amount_gwei': int.from_bytes(amount, 'little'),
+        'signature': '0x' + signature.hex(),
+        'deposit_index': int.from_bytes(index, 'little'),
+    }
+
+
+def decode_deposit_calldata(data):
+    # Calldata carries no amount (it is the transaction value) and no deposit index
+    view = memoryview(bytes.fromhex(data[2:]) if isinstance(data, str) else bytes(data))
+    if view[:4] != DEPOSIT_SELECTOR:
+        raise ValueError("Not a deposit() call")
+    args = view[4:]
+    if len(view) != CALLDATA_LENGTH or args[:len(CALLDATA_HEAD_BYTES)] != CALLDATA_HEAD_BYTES:
+        return decode_deposit_calldata_generic(view)
+
+    return {
+        'pubkey': '0x' + field(args, CALLDATA_HEAD[0], PUBKEY_LENGTH).hex(),
+        'withdrawal_credentials': '0x' + field(args, CALLDATA_HEAD[1], WITHDRAWAL_CREDENTIALS_LENGTH).hex(),
+        'signature': '0x' + field(args, CALLDATA_HEAD[2], SIGNATURE_LENGTH).hex(),
+    }
+
+
+def decode_deposit_calldatas(datas):
+    return [decode_deposit_calldata(data) for data in datas]
+
+
+def decode_deposit_calldata_generic(data):
+    pubkey, withdrawal_credentials, signature, _ = decode(['bytes', 'bytes', 'bytes', 'bytes32'], bytes(data)[4:])
+    return {
+        'pubkey': '0x' + pubkey.hex(),
+        'withdrawal_credentials': '0x' + withdrawal_credentials.hex(),
+        'signature': '0x' + signature.hex(),
+    }
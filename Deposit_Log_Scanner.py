@@ -0,0 +1,133 @@
+import logging
+import threading
+import requests
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# keccak256("DepositEvent(bytes,bytes,bytes,bytes,bytes)")
+DEPOSIT_EVENT_TOPIC = '0x649bbc62d0e31342afea4e5cd82d4049e7e1ee912fc0889aa790803be39038c5'
+
+# Substrings providers use when an eth_getLogs result or block range is too large
+RANGE_TOO_LARGE_MARKERS = (
+    'query returned more than',
+    'response size',
+    'block range',
+    'range is too large',
+    'range too large',
+    'too many results',
+)
+
+# Rate limits can share error codes such as -32005 with range errors, but a smaller range would
+# only mean more requests, so they are never treated as a rejected range
+RATE_LIMIT_MARKERS = (
+    'rate limit',
+    'too many requests',
+    'request count',
+)
+
+
+def is_range_too_large(error):
+    # Transport failures such as HTTP 429 or timeouts say nothing about the range and are re-raised
+    if isinstance(error, requests.RequestException):
+        return False
+    message = str(error).lower()
+    if any(marker in message for marker in RATE_LIMIT_MARKERS):
+        return False
+    return any(marker in message for marker in RANGE_TOO_LARGE_MARKERS)
+
+
+class DepositLogScanner:
+    def __init__(self, w3, contract_address, initial_range=100, min_range=1, max_range=10000,
+                 sparse_threshold=100, timestamp_cache_size=10000, rpc=None):
+        self.w3 = w3
+        self.rpc = rpc
+        self.contract_address = w3.to_checksum_address(contract_address)
+        self.range_size = initial_range
+        self.min_range = min_range
+        self.max_range = max_range
+        # Upper bound learned from rejected ranges so growth does not oscillate
+        self.range_ceiling = max_range
+        self.sparse_threshold = sparse_threshold
+        self.timestamp_cache_size = timestamp_cache_size
+        self.timestamps = OrderedDict()
+        self.timestamps_lock = threading.Lock()
+
+    def get_logs(self, start_block, end_block):
+        if self.rpc is not None:
+            return self.rpc.get_logs({
+                'fromBlock': hex(start_block),
+                'toBlock': hex(end_block),
+                'address': self.contract_address,
+                'topics': [DEPOSIT_EVENT_TOPIC]
+            })
+        return self.w3.eth.get_logs({
+            'fromBlock': start_block,
+            'toBlock': end_block,
+            'address': self.contract_address,
+            'topics': [DEPOSIT_EVENT_TOPIC]
+        })
+
+    def scan(self, start_block, end_block):
+        # Yields (chunk_start, chunk_end, logs) in order, growing the range while
+        # results are sparse and halving it when the provider rejects a response
+        chunk_start = start_block
+        while chunk_start <= end_block:
+            chunk_end = min(chunk_start + self.range_size - 1, end_block)
+            try:
+                logs = self.get_logs(chunk_start, chunk_end)
+            except Exception as e:
+                if not is_range_too_large(e) or self.range_size <= self.min_range:
+                    raise
+                self.range_size = max(self.min_range, (chunk_end - chunk_start + 1) // 2)
+                self.range_ceiling = self.range_size
+                logger.warning(f"eth_getLogs range {chunk_start}-{chunk_end} rejected, shrinking to {self.range_size} blocks: {e}")
+                continue
+
+            if len(logs) < self.sparse_threshold:
+                if self.range_size >= self.range_ceiling:
+                    # Probe slowly past the last known-good size
+                    self.range_ceiling = min(self.max_range, self.range_ceiling + max(1, self.range_ceiling // 8))
+                self.range_size = min(self.range_ceiling, self.range_size * 2)
+
+            yield chunk_start, chunk_end, logs
+            chunk_start = chunk_end + 1
+
+    def get_block_timestamp(self, block_number):
+        with self.timestamps_lock:
+            if block_number in self.timestamps:
+                self.timestamps.move_to_end(block_number)
+                return self.timestamps[block_number]
+
+        if self.rpc is not None:
+            timestamp = self.rpc.get_blocks([block_number])[0]['timestamp']
+        else:
+            timestamp = self.w3.eth.get_block(block_number)['timestamp']
+        with self.timestamps_lock:
+            self.timestamps[block_number] = timestamp
+            if len(self.timestamps) > self.timestamp_cache_size:
+                self.timestamps.popitem(last=False)
+        return timestamp
+
+    def get_block_timestamps(self, block_numbers):
+        # Fetches every uncached header in a single batch when a BatchRPC is available
+        with self.timestamps_lock:
+            missing = sorted(n for n in set(block_numbers) if n not in self.timestamps)
+        if missing and self.rpc is not None:
+            self.remember_timestamps(self.rpc.get_blocks(missing))
+        return {n: self.get_block_timestamp(n) for n in block_numbers}
+
+    def remember_timestamps(self, blocks):
+        with self.timestamps_lock:
+            for block in blocks:
+                if block is None:
+                    continue
+                self.timestamps[block['number']] = block['timestamp']
+                if len(self.timestamps) > self.timestamp_cache_size:
+                    self.timestamps.popitem(last=False)
+
+    def forget_timestamps_after(self, block_number):
+        # Orphaned blocks may have had different timestamps than their replacements
+        with self.timestamps_lock:
+            for n in [n for n in self.timestamps if n > block_number]:
+                del self.timestamps[n]
@@ -0,0 +1,317 @@
+import json
+import time
+import logging
+import threading
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+# Deposit_Rollups holds one row per block (bucket is the block number), per UTC hour and day
+# (bucket is the period's start timestamp) and one all-time row (bucket 0). Rows are adjusted
+# in the same transaction as the deposit writes and reorg invalidations that change them, so
+# stats are read by primary key instead of scanning Deposits.
+HOUR = 3600
+DAY = 86400
+GRANULARITIES = ('block', 'hour', 'day', 'total')
+
+# SQL for each granularity's bucket, used to build rollups from existing Deposits rows
+BUCKET_EXPRESSIONS = {
+    'block': 'blockNumber',
+    'hour': f'blockTimestamp - blockTimestamp % {HOUR}',
+    'day': f'blockTimestamp - blockTimestamp % {DAY}',
+    'total': '0',
+}
+
+# Largest number of rows one range query returns
+MAX_ROWS = 1000
+# Pubkey count rows looked up per statement
+PUBKEY_LOOKUP_ROWS = 1000
+
+
+def buckets_of(block_number, block_timestamp):
+    return (
+        ('block', block_number),
+        ('hour', block_timestamp - block_timestamp % HOUR),
+        ('day', block_timestamp - block_timestamp % DAY),
+        ('total', 0),
+    )
+
+
+def create_rollup_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Deposit_Rollups (
+            granularity ENUM('block', 'hour', 'day', 'total') NOT NULL,
+            bucket BIGINT NOT NULL,
+            deposits INT NOT NULL DEFAULT 0,
+            amount_gwei DECIMAL(38, 0) NOT NULL DEFAULT 0,
+            fee_wei DECIMAL(38, 0) NOT NULL DEFAULT 0,
+            distinct_pubkeys INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket)
+        )
+    ''')
+    # Deposits per pubkey in each bucket, so distinct counts stay exact when deposits are invalidated
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Deposit_Rollup_Pubkeys (
+            granularity ENUM('block', 'hour', 'day', 'total') NOT NULL,
+            bucket BIGINT NOT NULL,
+            pubkey VARCHAR(132) NOT NULL,
+            deposits INT NOT NULL,
+            PRIMARY KEY (granularity, bucket, pubkey)
+        )
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM Deposit_Rollups')
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("SELECT 1 FROM Deposits WHERE status = 'valid' LIMIT 1")
+        if cursor.fetchall():
+            build_rollups(cursor)
+
+
+def build_rollups(cursor):
+    # One-off migration for deposits ingested before rollups existed. The all-time bucket is a
+    # constant, which GROUP BY would read as a column position, so it is left out of the grouping.
+    for granularity, expression in BUCKET_EXPRESSIONS.items():
+        group_by = [] if granularity == 'total' else [expression]
+        cursor.execute(f'''
+            INSERT INTO Deposit_Rollup_Pubkeys (granularity, bucket, pubkey, deposits)
+            SELECT %s, {expression}, pubkey, COUNT(*) FROM Deposits
+            WHERE status = 'valid' AND pubkey IS NOT NULL
+            GROUP BY {', '.join(group_by + ['pubkey'])}
+        ''', (granularity,))
+        cursor.execute(f'''
+            INSERT INTO Deposit_Rollups (granularity, bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys)
+            SELECT %s, {expression}, COUNT(*), COALESCE(SUM(amount_gwei), 0),
+                   COALESCE(SUM(CAST(fee AS DECIMAL(38, 0))), 0), COUNT(DISTINCT pubkey)
+            FROM Deposits WHERE status = 'valid'
+            {'GROUP BY ' + expression if group_by else ''}
+        ''', (granularity,))
+        if cursor.rowcount > 0:
+            logger.info(f"Built {cursor.rowcount} {granularity} rollups from existing deposits")
+
+
+def rebuild_rollups(cursor):
+    # Recomputes every rollup from Deposits, for writes that bypass the incremental path such as bulk imports
+    cursor.execute('DELETE FROM Deposit_Rollup_Pubkeys')
+    cursor.execute('DELETE FROM Deposit_Rollups')
+    build_rollups(cursor)
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def newly_valid(cursor, deposits):
+    # Deposits not already stored as valid, which are the only ones that change the rollups;
+    # re-ingested deposits are upserted again but must not be counted twice
+    if not deposits:
+        return []
+    hashes = list({d['hash'] for d in deposits})
+    cursor.execute(f'''
+        SELECT hash, logIndex FROM Deposits
+        WHERE status = 'valid' AND hash IN ({placeholders(hashes)})
+        FOR UPDATE
+    ''', hashes)
+    seen = set(cursor.fetchall())
+    fresh = []
+    for deposit in deposits:
+        key = (deposit['hash'], deposit['logIndex'])
+        if key not in seen:
+            seen.add(key)
+            fresh.append(deposit)
+    return fresh
+
+
+def replace_legacy_deposits(cursor, deposits):
+    # Rows written before logIndex and the DepositData columns existed have no pubkey and a logIndex
+    # of 0 whatever the real one is, so their keys never match the re-ingested deposits. They are
+    # subtracted from the rollups and deleted, so the deposits that replace them are counted as new.
+    if not deposits:
+        return 0
+    hashes = list({d['hash'] for d in deposits})
+    cursor.execute(f'''
+        SELECT id, status, blockNumber, blockTimestamp, fee, amount_gwei FROM Deposits
+        WHERE pubkey IS NULL AND hash IN ({placeholders(hashes)})
+        FOR UPDATE
+    ''', hashes)
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    apply_deposits(cursor, [
+        {'blockNumber': block_number, 'blockTimestamp': block_timestamp, 'fee': fee, 'pubkey': None,
+         'amount_gwei': amount_gwei}
+        for _, status, block_number, block_timestamp, fee, amount_gwei in rows if status == 'valid'
+    ], sign=-1)
+    ids = [row[0] for row in rows]
+    cursor.execute(f'DELETE FROM Deposits WHERE id IN ({placeholders(ids)})', ids)
+    return len(ids)
+
+
+def load_pubkey_counts(cursor, keys):
+    # Row-value lookups on the full primary key, so only the requested rows are read and locked
+    keys = list(keys)
+    counts = {}
+    for i in range(0, len(keys), PUBKEY_LOOKUP_ROWS):
+        chunk = keys[i:i + PUBKEY_LOOKUP_ROWS]
+        cursor.execute(f'''
+            SELECT granularity, bucket, pubkey, deposits FROM Deposit_Rollup_Pubkeys
+            WHERE (granularity, bucket, pubkey) IN ({', '.join(['(%s, %s, %s)'] * len(chunk))})
+            FOR UPDATE
+        ''', [value for key in chunk for value in key])
+        for granularity, bucket, pubkey, deposits in cursor.fetchall():
+            counts[(granularity, bucket, pubkey)] = deposits
+    return counts
+
+
+def apply_deposits(cursor, deposits, sign=1):
+    # Adds (sign=1) or subtracts (sign=-1) deposits from every rollup they fall in. Deposits are
+    # dicts with blockNumber, blockTimestamp, fee, pubkey and amount_gwei; callers commit.
+    if not deposits:
+        return
+    totals = {}
+    pubkeys = {}
+    for deposit in deposits:
+        for key in buckets_of(deposit['blockNumber'], deposit['blockTimestamp']):
+            total = totals.setdefault(key, [0, 0, 0, 0])
+            total[0] += 1
+            total[1] += int(deposit['amount_gwei'] or 0)
+            total[2] += int(deposit['fee'] or 0)
+            if deposit['pubkey']:
+                pubkey_key = key + (deposit['pubkey'],)
+                pubkeys[pubkey_key] = pubkeys.get(pubkey_key, 0) + 1
+
+    upserts, deletes = [], []
+    if pubkeys:
+        existing = load_pubkey_counts(cursor, pubkeys)
+        for (granularity, bucket, pubkey), count in pubkeys.items():
+            before = existing.get((granularity, bucket, pubkey), 0)
+            after = before + sign * count
+            if after > 0:
+                upserts.append((granularity, bucket, pubkey, after))
+            elif before > 0:
+                deletes.append((granularity, bucket, pubkey))
+            if (before > 0) != (after > 0):
+                totals[(granularity, bucket)][3] += 1 if after > 0 else -1
+    if upserts:
+        cursor.executemany('''
+            INSERT INTO Deposit_Rollup_Pubkeys (granularity, bucket, pubkey, deposits)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE deposits = VALUES(deposits)
+        ''', upserts)
+    if deletes:
+        cursor.executemany('DELETE FROM Deposit_Rollup_Pubkeys WHERE granularity = %s AND bucket = %s AND pubkey = %s',
+                           deletes)
+
+    cursor.executemany('''
+        INSERT INTO Deposit_Rollups (granularity, bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            deposits = deposits + VALUES(deposits),
+            amount_gwei = amount_gwei + VALUES(amount_gwei),
+            fee_wei = fee_wei + VALUES(fee_wei),
+            distinct_pubkeys = distinct_pubkeys + VALUES(distinct_pubkeys)
+    ''', [
+        (granularity, bucket, sign * count, sign * amount, sign * fee, distinct)
+        for (granularity, bucket), (count, amount, fee, distinct) in totals.items()
+    ])
+    if sign < 0:
+        cursor.executemany('DELETE FROM Deposit_Rollups WHERE granularity = %s AND bucket = %s AND deposits <= 0',
+                           list(totals))
+
+
+def invalidate_deposits(cursor, where, params):
+    # Marks the valid deposits matching where as invalid and subtracts them from the rollups
+    cursor.execute(f'''
+        SELECT blockNumber, blockTimestamp, fee, pubkey, amount_gwei FROM Deposits
+        WHERE status = 'valid' AND {where}
+        FOR UPDATE
+    ''', params)
+    rows = cursor.fetchall()
+    apply_deposits(cursor, [
+        {'blockNumber': block_number, 'blockTimestamp': block_timestamp, 'fee': fee, 'pubkey': pubkey,
+         'amount_gwei': amount_gwei}
+        for block_number, block_timestamp, fee, pubkey, amount_gwei in rows
+    ], sign=-1)
+    cursor.execute(f"UPDATE Deposits SET status = 'invalid' WHERE status = 'valid' AND {where}", params)
+    return cursor.rowcount
+
+
+def rollup_row(bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys):
+    return {
+        'bucket': int(bucket),
+        'deposits': int(deposits),
+        'amount_gwei': int(amount_gwei),
+        'fee_wei': int(fee_wei),
+        'distinct_pubkeys': int(distinct_pubkeys),
+    }
+
+
+def empty_row(bucket):
+    return rollup_row(bucket, 0, 0, 0, 0)
+
+
+def rollup_rows(cursor, granularity, start=None, end=None, limit=MAX_ROWS):
+    # Newest first; for block rollups start and end are block numbers, otherwise timestamps
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    cursor.execute('''
+        SELECT bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys FROM Deposit_Rollups
+        WHERE granularity = %s AND bucket BETWEEN %s AND %s
+        ORDER BY bucket DESC
+        LIMIT %s
+    ''', (granularity, start if start is not None else 0, end if end is not None else 2 ** 62,
+          max(1, min(limit, MAX_ROWS))))
+    return [rollup_row(*row) for row in cursor.fetchall()]
+
+
+def rollup_summary(cursor, now=None):
+    # Current and previous hour and day, the latest block with deposits, and all-time totals
+    now = int(now if now is not None else time.time())
+    hour, day = now - now % HOUR, now - now % DAY
+    wanted = {
+        'current_hour': ('hour', hour), 'previous_hour': ('hour', hour - HOUR),
+        'today': ('day', day), 'yesterday': ('day', day - DAY), 'total': ('total', 0),
+    }
+    cursor.execute('''
+        SELECT granularity, bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys FROM Deposit_Rollups
+        WHERE (granularity = 'hour' AND bucket IN (%s, %s))
+           OR (granularity = 'day' AND bucket IN (%s, %s))
+           OR (granularity = 'total' AND bucket = 0)
+    ''', (hour, hour - HOUR, day, day - DAY))
+    found = {(granularity, int(bucket)): rollup_row(bucket, *values) for granularity, bucket, *values in cursor.fetchall()}
+    summary = {name: found.get(key, empty_row(key[1])) for name, key in wanted.items()}
+    latest = rollup_rows(cursor, 'block', limit=1)
+    summary['latest_block'] = latest[0] if latest else None
+    summary['as_of'] = now
+    return summary
+
+
+class RollupStatsHandler:
+    # Route for the local HTTP server, answering from its own MySQL connection:
+    #   /stats                     summary of the current and previous hour and day and all-time totals
+    #   /stats/<granularity>?start=&end=&limit=   rollup rows for block, hour or day, newest first
+    def __init__(self, connect):
+        self.connect = connect
+        self.db = None
+        self.lock = threading.Lock()
+
+    def __call__(self, path, query):
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        parts = [part for part in path.split('/') if part]
+        with self.lock:
+            if self.db is None or not self.db.is_connected():
+                self.db = self.connect()
+            cursor = self.db.cursor()
+            try:
+                if len(parts) == 1:
+                    result = rollup_summary(cursor, int(params['now']) if 'now' in params else None)
+                elif len(parts) == 2 and parts[1] in ('block', 'hour', 'day'):
+                    result = rollup_rows(cursor, parts[1],
+                                         int(params['start']) if 'start' in params else None,
+                                         int(params['end']) if 'end' in params else None,
+                                         int(params.get('limit', 100)))
+                else:
+                    raise LookupError(path)
+                # Ends the read snapshot so the next request sees newly committed rollups
+                self.db.commit()
+            finally:
+                cursor.close()
+        return 'application/json', json.dumps(result)
@@ -0,0 +1,191 @@
+import json
+import time
+import queue
+import logging
+import threading
+import requests
+from Metrics import LogRateLimiter
+
+logger = logging.getLogger(__name__)
+log_limiter = LogRateLimiter(logger, rate=0.2, burst=1)
+
+# What a sink does when its buffer is full:
+#   block        wait up to block_timeout for space, then drop the event; once a wait has timed
+#                out, events are dropped without waiting until the buffer accepts one again
+#   drop_newest  drop the incoming event
+#   drop_oldest  drop the oldest buffered event to make room
+BACKPRESSURE_POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+STOP = object()
+
+
+def deposits_event(deposits):
+    return {'type': 'deposits', 'deposits': list(deposits)}
+
+
+def reorg_event(ancestor, depth, invalidated):
+    return {'type': 'reorg', 'ancestor': ancestor, 'depth': depth, 'invalidated': invalidated}
+
+
+def json_default(value):
+    # HexBytes and other byte strings serialize as 0x-prefixed hex
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return str(value)
+
+
+def event_records(event):
+    # One JSON object per deposit, and one per reorg
+    if event['type'] == 'deposits':
+        return [{'type': 'deposit', **deposit} for deposit in event['deposits']]
+    return [event]
+
+
+class BufferedSink:
+    # Receives engine events on the ingestion thread and hands them to deliver() in batches on
+    # its own worker thread, through a bounded buffer governed by a backpressure policy.
+    # Subclasses implement deliver(events); an exception there counts the batch as failed.
+    name = 'sink'
+
+    def __init__(self, buffer_size=1000, policy='drop_oldest', block_timeout=5.0, max_batch=100):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy!r} for sink {self.name}")
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_batch = max_batch
+        self.thread = threading.Thread(target=self.work, name=f"sink-{self.name}", daemon=True)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.stalled = False
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        # Delivers what is already buffered, waiting at most timeout seconds
+        if not self.thread.is_alive():
+            return
+        try:
+            self.buffer.put(STOP, timeout=timeout)
+        except queue.Full:
+            logger.error(f"Sink {self.name} did not drain, discarding {self.buffer.qsize()} events")
+            return
+        self.thread.join(timeout)
+
+    def publish(self, event):
+        self.published += 1
+        try:
+            if self.policy == 'block':
+                if self.stalled:
+                    self.buffer.put_nowait(event)
+                else:
+                    self.buffer.put(event, timeout=self.block_timeout)
+                self.stalled = False
+                return
+            if self.policy == 'drop_oldest':
+                while True:
+                    try:
+                        self.buffer.put_nowait(event)
+                        return
+                    except queue.Full:
+                        try:
+                            self.buffer.get_nowait()
+                            self.count_dropped()
+                        except queue.Empty:
+                            pass
+            self.buffer.put_nowait(event)
+        except queue.Full:
+            self.stalled = self.policy == 'block'
+            self.count_dropped()
+
+    def count_dropped(self):
+        self.dropped += 1
+        log_limiter.log(logging.WARNING, 'dropped', lambda: f"Sink {self.name} buffer full, "
+                                                            f"{self.dropped} events dropped so far")
+
+    def work(self):
+        while True:
+            events = [self.buffer.get()]
+            while len(events) < self.max_batch:
+                try:
+                    events.append(self.buffer.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = events[-1] is STOP
+            events = [event for event in events if event is not STOP]
+            if events:
+                try:
+                    self.deliver(events)
+                    self.delivered += len(events)
+                except Exception as e:
+                    self.failed += len(events)
+                    logger.error(f"Sink {self.name} failed to deliver {len(events)} events: {e}")
+            if stopping:
+                return
+
+    def deliver(self, events):
+        raise NotImplementedError
+
+    def stats(self):
+        return {
+            'queue_depth': self.buffer.qsize(),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+class JSONLSink(BufferedSink):
+    # Appends one JSON line per deposit or reorg to a file, flushed after every batch
+    name = 'jsonl'
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.file = None
+
+    def start(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+        super().start()
+
+    def stop(self, timeout=10):
+        super().stop(timeout)
+        if self.file:
+            self.file.close()
+
+    def deliver(self, events):
+        lines = [json.dumps(record, default=json_default) for event in events for record in event_records(event)]
+        self.file.write(''.join(line + '\n' for line in lines))
+        self.file.flush()
+
+
+class WebhookSink(BufferedSink):
+    # POSTs batches as {"events": [...]} to a URL, retrying with exponential backoff
+    name = 'webhook'
+
+    def __init__(self, url, timeout=10, max_retries=3, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+
+    def deliver(self, events):
+        body = json.dumps({'events': [record for event in events for record in event_records(event)]},
+                          default=json_default)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, data=body, timeout=self.timeout,
+                                             headers={'Content-Type': 'application/json'})
+                response.raise_for_status()
+                return
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Webhook delivery failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
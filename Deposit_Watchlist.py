@@ -0,0 +1,86 @@
+import re
+
+# Watch targets are identified by their hex length: 48-byte validator pubkeys and 32-byte
+# withdrawal credentials, stored lowercase with a 0x prefix as the decoders produce them
+TARGET_KINDS = {96: 'pubkey', 64: 'withdrawal_credentials'}
+HEX = re.compile(r'^[0-9a-f]+$')
+SEPARATORS = re.compile(r'[\s,;"\']+')
+
+
+def parse_target(text):
+    # Returns (kind, target) or None when text is not a pubkey or withdrawal credentials
+    value = text.strip().lower()
+    if value.startswith('0x'):
+        value = value[2:]
+    kind = TARGET_KINDS.get(len(value))
+    if kind is None or not HEX.match(value):
+        return None
+    return kind, '0x' + value
+
+
+def parse_targets(text):
+    # Splits command arguments or an uploaded file on whitespace, commas and quotes, so plain
+    # lists and simple CSV exports both work. Returns unique targets in order and the rejected tokens.
+    targets, invalid, seen = [], [], set()
+    for token in SEPARATORS.split(text):
+        if not token:
+            continue
+        parsed = parse_target(token)
+        if parsed is None:
+            invalid.append(token)
+        elif parsed[1] not in seen:
+            seen.add(parsed[1])
+            targets.append(parsed)
+    return targets, invalid
+
+
+class WatchlistIndex:
+    # In-memory mirror of Telegram_Watchlist: target -> chat ids for matching deposits, and
+    # chat id -> targets for limits and listing. Only used from the Telegram sink's event loop.
+    def __init__(self):
+        self.chats = {}
+        self.targets = {}
+
+    def load(self, rows):
+        self.chats, self.targets = {}, {}
+        for chat_id, target in rows:
+            self.add(chat_id, [target])
+
+    def add(self, chat_id, targets):
+        watched = self.targets.setdefault(chat_id, set())
+        for target in targets:
+            watched.add(target)
+            self.chats.setdefault(target, set()).add(chat_id)
+
+    def remove(self, chat_id, targets):
+        watched = self.targets.get(chat_id, set())
+        for target in targets:
+            watched.discard(target)
+            chats = self.chats.get(target)
+            if chats is not None:
+                chats.discard(chat_id)
+                if not chats:
+                    del self.chats[target]
+        if not watched:
+            self.targets.pop(chat_id, None)
+
+    def remove_chat(self, chat_id):
+        self.remove(chat_id, list(self.targets.get(chat_id, ())))
+
+    def targets_of(self, chat_id):
+        return self.targets.get(chat_id, set())
+
+    def match(self, deposits):
+        # Two dict lookups per deposit; returns chat id -> the deposits that chat watches
+        routes = {}
+        for deposit in deposits:
+            for target in (deposit['pubkey'], deposit['withdrawal_credentials']):
+                for chat_id in self.chats.get(target, ()):
+                    matched = routes.setdefault(chat_id, [])
+                    # A deposit can match both its pubkey and its credentials for the same chat
+                    if not matched or matched[-1] is not deposit:
+                        matched.append(deposit)
+        return routes
+
+    def stats(self):
+        return {'targets': len(self.chats), 'chats': len(self.targets)}
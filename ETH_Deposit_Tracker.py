@@ -5,7 +5,21 @@ import logging
 from web3 import Web3
 from dotenv import load_dotenv
 import mysql.connector
-from eth_abi.abi import decode
+from Deposit_Log_Scanner import DepositLogScanner, DEPOSIT_EVENT_TOPIC
+from Block_Pipeline import BlockPipeline
+from RPC_Batch import to_hex
+from RPC_Pool import ProviderPool
+from Block_Hash_Chain import BlockHashChain
+from Write_Batcher import WriteBatcher
+from Block_Range_Index import load_ranges, save_range, truncate_ranges
+from Deposit_Cache import SeenDepositCache
+from Deposit_Decoder import decode_deposit_logs
+from Head_Tracker import HeadTracker
+from Metrics import (timed, record_head, watch_rpc, watch_sinks, start_metrics_server, LogRateLimiter,
+                     DB_TRANSACTIONS, DB_ROWS, DEPOSITS, REORGS, REORG_DEPTH_BLOCKS)
+from Sampling_Profiler import profiler
+from Deposit_Sinks import JSONLSink, WebhookSink, deposits_event, reorg_event
+from Deposit_Rollups import create_rollup_tables, replace_legacy_deposits, newly_valid, apply_deposits, invalidate_deposits, RollupStatsHandler
 
 # Load environment variables
 load_dotenv()
@@ -13,10 +27,32 @@ load_dotenv()
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+# Per-block and per-deposit messages are logged at debug level, at most about one per second each
+log_limiter = LogRateLimiter(logger)
 
 # Ethereum node RPC URL (replace with your Alchemy or Infura URL)
 ETH_RPC_URL = os.getenv('ETH_RPC_URL')
 
+# Comma-separated RPC endpoints, ranked by health, with failover and hedged requests; defaults to ETH_RPC_URL
+ETH_RPC_URLS = [url.strip() for url in os.getenv('ETH_RPC_URLS', ETH_RPC_URL or '').split(',') if url.strip()]
+RPC_TIMEOUT = float(os.getenv('RPC_TIMEOUT', '15'))
+# Seconds before a slow request is duplicated to the next endpoint; 0 disables hedging
+RPC_HEDGE_AFTER = float(os.getenv('RPC_HEDGE_AFTER', '1'))
+# Block and receipt responses kept in the RPC cache
+RPC_CACHE_SIZE = int(os.getenv('RPC_CACHE_SIZE', '2048'))
+
+# Optional WebSocket endpoint for newHeads subscriptions; without it the head is polled over ETH_RPC_URL
+WS_RPC_URL = os.getenv('WS_RPC_URL')
+
+# Longest wait for a new head before the loop runs anyway (gap fill, retries)
+HEAD_WAIT_TIMEOUT = float(os.getenv('HEAD_WAIT_TIMEOUT', '60'))
+
+# Local port serving Prometheus metrics at /metrics and profiler stacks at /profile; 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# Seconds between stack samples while tick, persist_blocks or handle_reorg run; 0 disables profiling
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0'))
+
 # MySQL Database configuration
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),
@@ -29,164 +65,610 @@ DB_CONFIG = {
 # Beacon Deposit Contract address
 BEACON_DEPOSIT_CONTRACT = '0x00000000219ab540356cBB839Cbe05303d7705Fa'
 
+# 'logs' reads DepositEvent logs over block ranges, 'blocks' scans every transaction of every block
+INGESTION_MODE = os.getenv('INGESTION_MODE', 'logs')
+
+# Catch-up settings: the pipelined engine is used when more than CATCHUP_THRESHOLD blocks behind head
+CATCHUP_THRESHOLD = int(os.getenv('CATCHUP_THRESHOLD', '50'))
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '8'))
+CATCHUP_CHUNK_SIZE = int(os.getenv('CATCHUP_CHUNK_SIZE', '100'))
+
+# Maximum number of calls packed into one JSON-RPC batch request
+RPC_BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', '20'))
+
+# Number of recent block hashes kept to detect reorgs and find the common ancestor
+REORG_DEPTH = int(os.getenv('REORG_DEPTH', '64'))
+
+# Deposits and block markers are buffered and written in one transaction per flush;
+# BATCHED_WRITES=false falls back to one committed INSERT per row
+BATCHED_WRITES = os.getenv('BATCHED_WRITES', 'true').lower() == 'true'
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '500'))
+WRITE_BATCH_DELAY = float(os.getenv('WRITE_BATCH_DELAY', '2'))
+
+# DepositData columns added to Deposits after the original schema
+DEPOSIT_DATA_COLUMNS = (
+    ('withdrawal_credentials', 'VARCHAR(66) AFTER pubkey'),
+    ('amount_gwei', 'BIGINT UNSIGNED AFTER withdrawal_credentials'),
+    ('signature', 'VARCHAR(194) AFTER amount_gwei'),
+    ('deposit_index', 'BIGINT UNSIGNED AFTER signature'),
+)
+
+# Ticks between passes that re-ingest gaps in the processed block ranges
+GAP_FILL_INTERVAL = int(os.getenv('GAP_FILL_INTERVAL', '240'))
+# Only gaps within this many blocks of the last processed block are filled by the live tracker;
+# older history is left to Backfill.py, whose workers may be leasing it
+GAP_FILL_WINDOW = int(os.getenv('GAP_FILL_WINDOW', '50000'))
+# Most blocks one tick re-ingests while filling gaps; the rest are filled on the following ticks
+GAP_FILL_MAX_BLOCKS = int(os.getenv('GAP_FILL_MAX_BLOCKS', '2000'))
+
+# Number of recently persisted deposit keys kept to skip re-scanned deposits
+SEEN_CACHE_SIZE = int(os.getenv('SEEN_CACHE_SIZE', '100000'))
+
+# Comma-separated consumers of committed deposits and reorgs besides MySQL: telegram, jsonl, webhook.
+# One chain read feeds all of them; each has its own bounded buffer so a slow one cannot stall ingestion.
+SINKS = [name.strip() for name in os.getenv('SINKS', '').split(',') if name.strip()]
+SINK_BUFFER_SIZE = int(os.getenv('SINK_BUFFER_SIZE', '1000'))
+# Longest wait for buffer space under the 'block' backpressure policy before an event is dropped;
+# while a sink stays full later events are dropped without waiting, so ingestion never stalls on it
+SINK_BLOCK_TIMEOUT = float(os.getenv('SINK_BLOCK_TIMEOUT', '0.05'))
+JSONL_PATH = os.getenv('JSONL_PATH', 'deposits.jsonl')
+# Backpressure policies: block, drop_newest or drop_oldest
+JSONL_BACKPRESSURE = os.getenv('JSONL_BACKPRESSURE', 'drop_oldest')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_BACKPRESSURE = os.getenv('WEBHOOK_BACKPRESSURE', 'drop_oldest')
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', '10'))
+
 # Initialize Web3
-w3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
+w3 = Web3(Web3.HTTPProvider(ETH_RPC_URLS[0] if ETH_RPC_URLS else None))
+rpc = ProviderPool(ETH_RPC_URLS, max_batch_size=RPC_BATCH_SIZE, timeout=RPC_TIMEOUT,
+                   hedge_after=RPC_HEDGE_AFTER, cache_size=RPC_CACHE_SIZE)
+
+
+def build_sinks(names):
+    sinks = []
+    for name in names:
+        if name == 'jsonl':
+            sinks.append(JSONLSink(JSONL_PATH, buffer_size=SINK_BUFFER_SIZE, policy=JSONL_BACKPRESSURE,
+                                   block_timeout=SINK_BLOCK_TIMEOUT))
+        elif name == 'webhook':
+            if not WEBHOOK_URL:
+                raise ValueError("The webhook sink needs WEBHOOK_URL")
+            sinks.append(WebhookSink(WEBHOOK_URL, timeout=WEBHOOK_TIMEOUT, buffer_size=SINK_BUFFER_SIZE,
+                                     policy=WEBHOOK_BACKPRESSURE, block_timeout=SINK_BLOCK_TIMEOUT))
+        elif name == 'telegram':
+            # python-telegram-bot is only needed when the Telegram sink is enabled
+            from Telegram_Notification import TelegramSink
+            sinks.append(TelegramSink(DB_CONFIG))
+        else:
+            raise ValueError(f"Unknown sink {name!r}")
+    return sinks
+
+def create_tables(cursor):
+    # Creates and migrates every table the tracker writes; callers commit
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Deposits (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            blockNumber INT,
+            blockTimestamp INT,
+            fee VARCHAR(255),
+            hash VARCHAR(66),
+            logIndex INT NOT NULL DEFAULT 0,
+            pubkey VARCHAR(132),
+            withdrawal_credentials VARCHAR(66),
+            amount_gwei BIGINT UNSIGNED,
+            signature VARCHAR(194),
+            deposit_index BIGINT UNSIGNED,
+            status ENUM('valid', 'invalid') DEFAULT 'valid',
+            created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY deposit_key (hash, logIndex),
+            INDEX (blockNumber)
+        )
+    ''')
+    # Tables created before the full DepositData was decoded lack these columns
+    for column, definition in DEPOSIT_DATA_COLUMNS:
+        cursor.execute(f"SHOW COLUMNS FROM Deposits LIKE '{column}'")
+        if not cursor.fetchall():
+            cursor.execute(f'ALTER TABLE Deposits ADD COLUMN {column} {definition}')
+    # Hashes written through HexBytes.hex() lack the 0x prefix under hexbytes 1.x
+    cursor.execute("SELECT 1 FROM Deposits WHERE hash NOT LIKE '0x%' LIMIT 1")
+    if cursor.fetchall():
+        cursor.execute("UPDATE IGNORE Deposits SET hash = CONCAT('0x', hash) WHERE hash NOT LIKE '0x%'")
+        logger.info(f"Added the 0x prefix to {cursor.rowcount} deposit hashes")
+    # Tables created before deposits were keyed by (hash, logIndex) hold duplicate rows. Their rows
+    # have no pubkey and are replaced by the real deposits whenever those blocks are ingested again.
+    cursor.execute("SHOW COLUMNS FROM Deposits LIKE 'logIndex'")
+    if not cursor.fetchall():
+        cursor.execute('ALTER TABLE Deposits ADD COLUMN logIndex INT NOT NULL DEFAULT 0 AFTER hash')
+    cursor.execute("SHOW INDEX FROM Deposits WHERE Key_name = 'deposit_key'")
+    if not cursor.fetchall():
+        cursor.execute('''
+            DELETE newer FROM Deposits newer
+            JOIN Deposits older
+                ON newer.hash = older.hash AND newer.logIndex = older.logIndex AND newer.id > older.id
+        ''')
+        logger.info(f"Removed {cursor.rowcount} duplicate deposits")
+        cursor.execute('ALTER TABLE Deposits ADD UNIQUE KEY deposit_key (hash, logIndex)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Processed_Blocks (
+            block_number INT PRIMARY KEY,
+            block_hash VARCHAR(66),
+            parent_hash VARCHAR(66),
+            processed_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Tables created before block hashes were tracked need the new columns
+    cursor.execute("SHOW COLUMNS FROM Processed_Blocks LIKE 'block_hash'")
+    if not cursor.fetchall():
+        cursor.execute('''
+            ALTER TABLE Processed_Blocks
+                ADD COLUMN block_hash VARCHAR(66),
+                ADD COLUMN parent_hash VARCHAR(66)
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Processed_Ranges (
+            start_block INT PRIMARY KEY,
+            end_block INT NOT NULL,
+            INDEX (end_block)
+        )
+    ''')
+    # Collapse per-block markers left by older versions into contiguous ranges, keeping
+    # Processed_Blocks rows only for the recent hashes used by reorg detection
+    cursor.execute('SELECT COUNT(*) FROM Processed_Ranges')
+    if cursor.fetchone()[0] == 0:
+        cursor.execute('''
+            INSERT INTO Processed_Ranges (start_block, end_block)
+            SELECT MIN(block_number), MAX(block_number) FROM (
+                SELECT block_number, block_number - ROW_NUMBER() OVER (ORDER BY block_number) AS grp
+                FROM Processed_Blocks
+            ) numbered
+            GROUP BY grp
+        ''')
+        if cursor.rowcount:
+            logger.info(f"Migrated Processed_Blocks into {cursor.rowcount} processed ranges")
+        cursor.execute('SELECT MAX(block_number) FROM Processed_Blocks')
+        last_block = cursor.fetchone()[0]
+        if last_block is not None:
+            cursor.execute('''
+                DELETE FROM Processed_Blocks
+                WHERE block_number <= %s OR block_hash IS NULL
+            ''', (last_block - REORG_DEPTH,))
+    create_rollup_tables(cursor)
+
 
 class DepositTracker:
-    def __init__(self):
+    # The single ingestion engine: reads the chain once, writes deposits and the processed-range
+    # checkpoint to MySQL in one transaction, then publishes the committed deposits and any
+    # reorgs to every sink
+    def __init__(self, sinks=None):
         try:
+            self.sinks = list(sinks or [])
             self.db = mysql.connector.connect(**DB_CONFIG)
             self.cursor = self.db.cursor()
             self.create_tables()
+            self.processed_ranges = load_ranges(self.cursor)
             self.last_processed_block = self.get_last_processed_block()
+            self.ticks = 0
+            self.gaps_pending = False
+            self.head_block = self.last_processed_block
+            self.block_hashes = self.load_block_hashes()
+            self.seen_deposits = self.load_seen_deposits()
+            self.writer = WriteBatcher(self.db, self.processed_ranges, max_rows=WRITE_BATCH_SIZE,
+                                       max_delay=WRITE_BATCH_DELAY, hash_retention=REORG_DEPTH, on_flush=self.publish_deposits)
+            self.log_scanner = DepositLogScanner(w3, BEACON_DEPOSIT_CONTRACT, rpc=rpc)
+            self.heads = HeadTracker(rpc, ws_url=WS_RPC_URL)
+            watch_rpc(rpc)
         except mysql.connector.Error as err:
             logger.error(f"Error connecting to MySQL database: {err}")
             raise
 
     def create_tables(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Deposits (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                blockNumber INT,
-                blockTimestamp INT,
-                fee VARCHAR(255),
-                hash VARCHAR(66),
-                pubkey VARCHAR(132),
-                status ENUM('valid', 'invalid') DEFAULT 'valid',
-                created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                INDEX (hash),
-                INDEX (blockNumber)
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Processed_Blocks (
-                block_number INT PRIMARY KEY,
-                processed_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        create_tables(self.cursor)
         self.db.commit()
 
     def get_last_processed_block(self):
-        self.cursor.execute('SELECT MAX(block_number) FROM Processed_Blocks')
-        result = self.cursor.fetchone()
-        if result[0]:
-            return result[0]
+        last_block = self.processed_ranges.last_block()
+        if last_block is not None:
+            return last_block
         else:
             # If no blocks have been processed, start from 100 blocks ago
-            latest_block = w3.eth.get_block('latest')['number']
+            latest_block = rpc.get_block_number()
             return latest_block - 100
 
-    def save_processed_block(self, block_number):
+    def load_block_hashes(self):
+        chain = BlockHashChain(REORG_DEPTH)
         self.cursor.execute('''
-            INSERT INTO Processed_Blocks (block_number) 
-            VALUES (%s) 
-            ON DUPLICATE KEY UPDATE processed_timestamp = CURRENT_TIMESTAMP
-        ''', (block_number,))
-        self.db.commit()
+            SELECT block_number, block_hash, parent_hash FROM Processed_Blocks
+            WHERE block_hash IS NOT NULL
+            ORDER BY block_number DESC
+            LIMIT %s
+        ''', (REORG_DEPTH,))
+        for block_number, block_hash, parent_hash in reversed(self.cursor.fetchall()):
+            chain.add(block_number, block_hash, parent_hash)
+        return chain
+
+    def load_seen_deposits(self):
+        seen = SeenDepositCache(SEEN_CACHE_SIZE)
+        self.cursor.execute('''
+            SELECT hash, logIndex, blockNumber FROM Deposits
+            WHERE status = 'valid' AND pubkey IS NOT NULL
+            ORDER BY id DESC
+            LIMIT %s
+        ''', (SEEN_CACHE_SIZE,))
+        for tx_hash, log_index, block_number in reversed(self.cursor.fetchall()):
+            seen.add((tx_hash, log_index), block_number)
+        return seen
 
+    @timed('db_write')
+    def save_processed_block(self, block_number, block_hash=None, parent_hash=None):
+        try:
+            if block_hash is not None:
+                self.cursor.execute('''
+                    INSERT INTO Processed_Blocks (block_number, block_hash, parent_hash) 
+                    VALUES (%s, %s, %s) 
+                    ON DUPLICATE KEY UPDATE
+                        processed_timestamp = CURRENT_TIMESTAMP,
+                        block_hash = VALUES(block_hash),
+                        parent_hash = VALUES(parent_hash)
+                ''', (block_number, block_hash, parent_hash))
+            save_range(self.cursor, self.processed_ranges, block_number, block_number)
+            self.db.commit()
+            DB_TRANSACTIONS.inc()
+            DB_ROWS.inc(1 if block_hash is None else 2)
+        except Exception:
+            self.db.rollback()
+            load_ranges(self.cursor, self.processed_ranges)
+            raise
+
+    @timed('db_write')
     def save_deposit(self, deposit):
+        replace_legacy_deposits(self.cursor, [deposit])
+        fresh = newly_valid(self.cursor, [deposit])
         self.cursor.execute('''
-            INSERT INTO deposits (blockNumber, blockTimestamp, fee, hash, pubkey)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO Deposits (blockNumber, blockTimestamp, fee, hash, logIndex, pubkey,
+                                  withdrawal_credentials, amount_gwei, signature, deposit_index)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE 
-                blockNumber = %s, 
-                blockTimestamp = %s, 
-                fee = %s, 
-                pubkey = %s
+                blockNumber = VALUES(blockNumber), 
+                blockTimestamp = VALUES(blockTimestamp), 
+                fee = VALUES(fee), 
+                pubkey = VALUES(pubkey),
+                withdrawal_credentials = VALUES(withdrawal_credentials),
+                amount_gwei = VALUES(amount_gwei),
+                signature = VALUES(signature),
+                deposit_index = VALUES(deposit_index),
+                status = 'valid'
         ''', (
-            deposit['blockNumber'], deposit['blockTimestamp'], deposit['fee'], deposit['hash'], deposit['pubkey'],
-            deposit['blockNumber'], deposit['blockTimestamp'], deposit['fee'], deposit['pubkey']
+            deposit['blockNumber'], deposit['blockTimestamp'], deposit['fee'], deposit['hash'], deposit['logIndex'],
+            deposit['pubkey'], deposit['withdrawal_credentials'], deposit['amount_gwei'], deposit['signature'],
+            deposit['deposit_index']
         ))
+        apply_deposits(self.cursor, fresh)
         self.db.commit()
-        logger.info(f"Saved Deposit: {deposit['hash']}")
+        DB_TRANSACTIONS.inc()
+        DB_ROWS.inc()
+        log_limiter.debug('deposit', lambda: f"Saved Deposit: {deposit['hash']}")
+        self.publish_deposits([deposit])
 
-    def invalidate_deposit(self, tx_hash):
-        self.cursor.execute('''
-            UPDATE Deposits 
-            SET status = 'invalid' 
-            WHERE hash = %s
-        ''', (tx_hash,))
-        self.db.commit()
-        logger.info(f"Invalidated Deposit: {tx_hash}")
+    def publish(self, event):
+        # Sinks only buffer here; a failing sink must not interrupt ingestion
+        for sink in self.sinks:
+            try:
+                sink.publish(event)
+            except Exception as e:
+                logger.error(f"Error publishing {event['type']} event to sink {sink.name}: {e}")
 
-    def extract_pubkey(self, input_data):
-        try:
-            decoded = decode(['bytes', 'bytes', 'bytes', 'bytes32'], bytes.fromhex(input_data[2:]))
-            return '0x' + decoded[0].hex()
-        except Exception as e:
-            logger.error(f"Error decoding pubkey: {e}")
-            return None
+    def publish_deposits(self, deposits):
+        # Only called once the deposits are committed, from the ingestion thread
+        if self.sinks and deposits:
+            self.publish(deposits_event(deposits))
 
-    def process_block(self, block_number):
-        try:
-            block = w3.eth.get_block(block_number, full_transactions=True)
-            
+    def is_deposit_transaction(self, tx):
+        return tx['to'] is not None and tx['to'].lower() == BEACON_DEPOSIT_CONTRACT.lower()
+
+    def fetch_blocks(self, start_block, end_block):
+        blocks = rpc.get_blocks(range(start_block, end_block + 1), full_transactions=True)
+        if any(block is None for block in blocks):
+            raise ValueError(f"Blocks {start_block}-{end_block} not available yet")
+        # Receipts carry the DepositEvent log index and are only fetched for deposit transactions
+        tx_hashes = [tx['hash'] for block in blocks for tx in block['transactions'] if self.is_deposit_transaction(tx)]
+        receipts = {to_hex(receipt['transactionHash']): receipt for receipt in rpc.get_receipts(tx_hashes) if receipt}
+        return blocks, receipts
+
+    def header_of(self, block):
+        return block['number'], to_hex(block['hash']), to_hex(block['parentHash'])
+
+    @timed('decode')
+    def decode_blocks(self, fetched):
+        blocks, receipts = fetched
+        deposits = []
+        datas = []
+        headers = [self.header_of(block) for block in blocks]
+        for block in blocks:
             for tx in block['transactions']:
                 try:
-                    if tx['to'] is not None and tx['to'].lower() == BEACON_DEPOSIT_CONTRACT.lower():
-                        deposit = {
-                            'blockNumber': block_number,
-                            'blockTimestamp': block['timestamp'],
-                            'fee': str(tx['gas'] * tx['gasPrice']),
-                            'hash': tx['hash'].hex(),
-                            'pubkey': self.extract_pubkey(tx['input'])
-                        }
-                        self.save_deposit(deposit)
+                    if self.is_deposit_transaction(tx):
+                        # Reverted deposits emit no DepositEvent and are skipped
+                        for log in receipts[to_hex(tx['hash'])]['logs']:
+                            if to_hex(log['topics'][0]) != DEPOSIT_EVENT_TOPIC:
+                                continue
+                            deposits.append({
+                                'blockNumber': block['number'],
+                                'blockTimestamp': block['timestamp'],
+                                'fee': str(tx['gas'] * tx['gasPrice']),
+                                'hash': to_hex(tx['hash']),
+                                'logIndex': log['logIndex']
+                            })
+                            datas.append(log['data'])
                 except Exception as e:
                     logger.error(f"Error processing transaction {tx.get('hash', 'Unknown')}: {e}")
-            
-            self.save_processed_block(block_number)
-            logger.info(f"Processed and Saved Block {block_number}")
+
+        decoded = []
+        for deposit, deposit_data in zip(deposits, decode_deposit_logs(datas, skip_invalid=True)):
+            if deposit_data is None:
+                logger.error(f"Error decoding deposit data for transaction {deposit['hash']}")
+                continue
+            deposit.update(deposit_data)
+            decoded.append(deposit)
+        return decoded, headers
+
+    def fetch_log_details(self, start_block, end_block, logs):
+        # Headers are only needed for blocks close enough to head to still be reorged
+        tail_start = max(start_block, self.head_block - REORG_DEPTH + 1)
+        headers = []
+        if tail_start <= end_block:
+            blocks = rpc.get_blocks(range(tail_start, end_block + 1))
+            if any(block is None for block in blocks):
+                raise ValueError(f"Blocks {tail_start}-{end_block} not available yet")
+            self.log_scanner.remember_timestamps(blocks)
+            headers = [self.header_of(block) for block in blocks]
+
+        tx_hashes = list(dict.fromkeys(to_hex(log['transactionHash']) for log in logs))
+        fees = {
+            tx_hash: str(tx['gas'] * tx['gasPrice'])
+            for tx_hash, tx in zip(tx_hashes, rpc.get_transactions(tx_hashes))
+        }
+        timestamps = self.log_scanner.get_block_timestamps({log['blockNumber'] for log in logs})
+        return logs, fees, timestamps, headers
+
+    def fetch_range(self, start_block, end_block):
+        logs = [log for _, _, chunk_logs in self.log_scanner.scan(start_block, end_block) for log in chunk_logs]
+        return self.fetch_log_details(start_block, end_block, logs)
+
+    @timed('decode')
+    def decode_logs(self, fetched):
+        logs, fees, timestamps, headers = fetched
+        deposits = []
+        for log, deposit_data in zip(logs, decode_deposit_logs([log['data'] for log in logs], skip_invalid=True)):
+            tx_hash = to_hex(log['transactionHash'])
+            try:
+                if deposit_data is None:
+                    raise ValueError("undecodable DepositEvent data")
+                deposits.append({
+                    'blockNumber': log['blockNumber'],
+                    'blockTimestamp': timestamps[log['blockNumber']],
+                    'fee': fees[tx_hash],
+                    'hash': tx_hash,
+                    'logIndex': log['logIndex'],
+                    **deposit_data
+                })
+            except Exception as e:
+                logger.error(f"Error processing deposit log {tx_hash}: {e}")
+        return deposits, headers
+
+    @profiler.section('persist_blocks')
+    def persist_blocks(self, start_block, end_block, decoded):
+        deposits, headers = decoded
+        # Refuse to extend the stored chain with a block from another fork
+        chain = self.block_hashes
+        for block_number, block_hash, parent_hash in headers:
+            if not chain.links(block_number, parent_hash):
+                rpc.forget_after(block_number - 1)
+                raise ValueError(f"Parent hash mismatch at block {block_number}, waiting for reorg handling")
+
+        # Deposits persisted by an earlier pass skip both the write and the notification
+        deposits = [d for d in deposits if (d['hash'], d['logIndex']) not in self.seen_deposits]
+
+        hashes = {block_number: (block_hash, parent_hash) for block_number, block_hash, parent_hash in headers}
+        if BATCHED_WRITES:
+            # Markers follow their deposits and the buffer is flushed before the watermark advances
+            for deposit in deposits:
+                self.writer.add_deposit(deposit)
+            for block_number in range(start_block, end_block + 1):
+                self.writer.add_block(block_number, *hashes.get(block_number, (None, None)))
+            self.writer.flush()
+        else:
+            for deposit in deposits:
+                try:
+                    self.save_deposit(deposit)
+                except Exception as e:
+                    logger.error(f"Error saving deposit {deposit['hash']}: {e}")
+            for block_number in range(start_block, end_block + 1):
+                self.save_processed_block(block_number, *hashes.get(block_number, (None, None)))
+
+        for deposit in deposits:
+            self.seen_deposits.add((deposit['hash'], deposit['logIndex']), deposit['blockNumber'])
+        for block_number, block_hash, parent_hash in headers:
+            # Gap-fill passes may revisit older blocks; only newer blocks extend the chain
+            if chain.latest() is None or block_number > chain.latest():
+                chain.add(block_number, block_hash, parent_hash)
+        DEPOSITS.inc(len(deposits))
+        if start_block == end_block:
+            log_limiter.debug('block', lambda: f"Processed and Saved Block {start_block}")
+        else:
+            log_limiter.debug('block', lambda: f"Processed and Saved Blocks {start_block}-{end_block} ({len(deposits)} deposits)")
+
+    def process_range(self, start_block, end_block):
+        # Returns the last block that was fully ingested so the caller can advance its watermark
+        last_block = start_block - 1
+        try:
+            for chunk_start, chunk_end, logs in self.log_scanner.scan(start_block, end_block):
+                self.persist_blocks(chunk_start, chunk_end, self.decode_logs(self.fetch_log_details(chunk_start, chunk_end, logs)))
+                last_block = chunk_end
         except Exception as e:
-            logger.error(f"Error processing block {block_number}: {e}")
+            logger.error(f"Error processing blocks {last_block + 1}-{end_block}: {e}")
+        return last_block
 
-    def handle_reorg(self, new_block_number):
-        check_depth = 10
-        start_block = max(new_block_number - check_depth, self.last_processed_block)
-        
-        for block_number in range(start_block, new_block_number + 1):
+    def catch_up(self, start_block, end_block):
+        # Fetches many blocks or log ranges concurrently while persisting them in order
+        if INGESTION_MODE == 'logs':
+            pipeline = BlockPipeline(self.fetch_range, self.decode_logs, self.persist_blocks,
+                                     workers=FETCH_WORKERS, chunk_size=CATCHUP_CHUNK_SIZE)
+        else:
+            pipeline = BlockPipeline(self.fetch_blocks, self.decode_blocks, self.persist_blocks,
+                                     workers=FETCH_WORKERS, chunk_size=RPC_BATCH_SIZE)
+        return pipeline.run(start_block, end_block)
+
+    def ingest_blocks(self, start_block, end_block):
+        if start_block > end_block:
+            return start_block - 1
+        if INGESTION_MODE == 'logs':
+            return self.process_range(start_block, end_block)
+        for chunk_start in range(start_block, end_block + 1, RPC_BATCH_SIZE):
+            chunk_end = min(chunk_start + RPC_BATCH_SIZE - 1, end_block)
             try:
-                block = w3.eth.get_block(block_number)
-                self.cursor.execute('SELECT hash FROM Deposits WHERE blockNumber = %s', (block_number,))
-                deposits = self.cursor.fetchall()
-                
-                for deposit in deposits:
-                    tx_hash = deposit[0]
-                    try:
-                        tx = w3.eth.get_transaction(tx_hash)
-                        if tx['blockNumber'] != block_number:
-                            logger.warning(f"Reorg detected for transaction {tx_hash}")
-                            self.invalidate_deposit(tx_hash)
-                    except Exception:
-                        logger.warning(f"Transaction {tx_hash} not found, likely due to reorg")
-                        self.invalidate_deposit(tx_hash)
-                
-                self.db.commit()
-                self.process_block(block_number)
+                self.persist_blocks(chunk_start, chunk_end, self.decode_blocks(self.fetch_blocks(chunk_start, chunk_end)))
             except Exception as e:
-                logger.error(f"Error handling reorg for block {block_number}: {e}")
+                logger.error(f"Error processing blocks {chunk_start}-{chunk_end}: {e}")
+                return chunk_start - 1
+        return end_block
+
+    def find_common_ancestor(self):
+        # Compares every remembered hash with the canonical chain in one batch, newest first
+        block_numbers = self.block_hashes.block_numbers()
+        canonical = rpc.get_blocks(block_numbers, cached=False)
+        for block_number, block in zip(block_numbers, canonical):
+            if block is not None and to_hex(block['hash']) == self.block_hashes.get_hash(block_number):
+                return block_number
+        logger.error(f"No common ancestor within the last {len(block_numbers)} blocks, rolling back {REORG_DEPTH} blocks")
+        return self.last_processed_block - REORG_DEPTH
+
+    def rollback(self, ancestor):
+        # Invalidates deposits in orphaned blocks so they are re-ingested from the canonical chain,
+        # subtracting them from the rollups in the same transaction
+        invalidated = invalidate_deposits(self.cursor, 'blockNumber > %s', (ancestor,))
+        self.cursor.execute('DELETE FROM Processed_Blocks WHERE block_number > %s', (ancestor,))
+        truncate_ranges(self.cursor, self.processed_ranges, ancestor)
+        self.db.commit()
+        self.block_hashes.truncate(ancestor)
+        self.seen_deposits.forget_after(ancestor)
+        self.log_scanner.forget_timestamps_after(ancestor)
+        rpc.forget_after(ancestor)
+        logger.warning(f"Rolled back to block {ancestor}, invalidated {invalidated} deposits from orphaned blocks")
+        REORGS.inc()
+        REORG_DEPTH_BLOCKS.observe(self.last_processed_block - ancestor)
+        self.publish(reorg_event(ancestor, self.last_processed_block - ancestor, invalidated))
+        self.last_processed_block = ancestor
+
+    def fill_gaps(self):
+        # Re-ingests blocks missing from the processed ranges within the last GAP_FILL_WINDOW blocks,
+        # at most GAP_FILL_MAX_BLOCKS per call so head following is never held up for long.
+        # Ranges are reloaded first so blocks written by backfill workers are not fetched again.
+        load_ranges(self.cursor, self.processed_ranges)
+        first_block = self.processed_ranges.first_block()
+        if first_block is None:
+            return
+        window_start = max(first_block, self.last_processed_block - GAP_FILL_WINDOW + 1)
+        budget = GAP_FILL_MAX_BLOCKS
+        self.gaps_pending = False
+        for start_block, gap_end in self.processed_ranges.gaps(start=window_start, end=self.last_processed_block):
+            if budget <= 0:
+                self.gaps_pending = True
+                break
+            end_block = min(gap_end, start_block + budget - 1)
+            self.gaps_pending = end_block < gap_end
+            budget -= end_block - start_block + 1
+            logger.warning(f"Filling gap in processed blocks {start_block}-{end_block}")
+            if end_block - start_block + 1 > CATCHUP_THRESHOLD:
+                self.catch_up(start_block, end_block)
+            else:
+                self.ingest_blocks(start_block, end_block)
+
+    @profiler.section('handle_reorg')
+    def handle_reorg(self, head):
+        # Steady state needs no extra call: the new head is usually the child of the last processed block
+        last_hash = self.block_hashes.get_hash(self.last_processed_block)
+        if last_hash is None:
+            return
+
+        try:
+            if head['number'] == self.last_processed_block:
+                reorged = to_hex(head['hash']) != last_hash
+            elif head['number'] == self.last_processed_block + 1:
+                reorged = to_hex(head['parentHash']) != last_hash
+            elif head['number'] > self.last_processed_block:
+                child = rpc.get_blocks([self.last_processed_block + 1], cached=False)[0]
+                reorged = child is not None and to_hex(child['parentHash']) != last_hash
+            else:
+                canonical = rpc.get_blocks([self.last_processed_block], cached=False)[0]
+                reorged = canonical is None or to_hex(canonical['hash']) != last_hash
+
+            if reorged:
+                logger.warning(f"Reorg detected at block {self.last_processed_block}, walking back to the common ancestor")
+                self.rollback(self.find_common_ancestor())
+        except Exception as e:
+            logger.error(f"Error handling reorg at block {self.last_processed_block}: {e}")
+
+    @profiler.section('tick')
+    def tick(self, head):
+        current_block = head['number']
+        self.head_block = current_block
+
+        round_trips = rpc.round_trips
+        self.handle_reorg(head)
+        if self.gaps_pending or self.ticks % GAP_FILL_INTERVAL == 0:
+            self.fill_gaps()
+        self.ticks += 1
+
+        previous_block = self.last_processed_block
+        if current_block - self.last_processed_block > CATCHUP_THRESHOLD:
+            self.last_processed_block = self.catch_up(self.last_processed_block + 1, current_block)
+        else:
+            self.last_processed_block = self.ingest_blocks(self.last_processed_block + 1, current_block)
+
+        record_head(current_block, head['timestamp'], self.last_processed_block)
+        log_limiter.debug('tick', lambda: f"Tick used {rpc.round_trips - round_trips} batched RPC round trips, "
+                                          f"RPC cache hit rate {rpc.stats().get('cache_hit_rate', 0.0):.0%}")
+        # True when progress was made but head is still ahead, so the next tick should not wait
+        return previous_block < self.last_processed_block < current_block
 
     def run(self):
+        profiler.configure(PROFILE_SAMPLE_INTERVAL)
+        start_metrics_server(METRICS_PORT, METRICS_HOST, profiler,
+                             routes={'/stats': RollupStatsHandler(lambda: mysql.connector.connect(**DB_CONFIG))})
+        for sink in self.sinks:
+            sink.start()
+        watch_sinks(self.sinks)
+        self.heads.start()
+        seen = 0
+        error_delay = 1
         while True:
             try:
-                current_block = w3.eth.get_block('latest')['number']
-                
-                if current_block > self.last_processed_block:
-                    self.handle_reorg(current_block)
-                
-                while self.last_processed_block < current_block:
-                    self.last_processed_block += 1
-                    self.process_block(self.last_processed_block)
-                
-                time.sleep(15)  # Wait for 15 seconds before checking for new blocks
+                # Wakes as soon as a new head arrives, or after HEAD_WAIT_TIMEOUT without one
+                head, seen = self.heads.wait(seen, HEAD_WAIT_TIMEOUT)
+                if head is None:
+                    continue
+                if self.tick(head):
+                    seen = None
+                error_delay = 1
             except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                time.sleep(60)  # Wait for 1 minute before retrying in case of a major error
+                logger.error(f"Error in main loop, retrying in {error_delay}s: {e}")
+                time.sleep(error_delay)
+                error_delay = min(error_delay * 2, 60)
 
-if __name__ == "__main__":
+def main(sink_names=SINKS):
+    sinks = []
     try:
-        tracker = DepositTracker()
+        sinks = build_sinks(sink_names)
+        tracker = DepositTracker(sinks)
         tracker.run()
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
-        logger.error(f"Failed to initialize or run DepositTracker: {e}")
\ No newline at end of file
+        logger.error(f"Failed to initialize or run DepositTracker: {e}")
+    finally:
+        for sink in sinks:
+            sink.stop()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
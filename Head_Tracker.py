@@ -0,0 +1,130 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+import websockets
+from RPC_Batch import format_result
+
+logger = logging.getLogger(__name__)
+
+
+class HeadTracker:
+    # Follows the chain head on a background thread and wakes waiters as soon as a new head
+    # is seen. Uses a newHeads WebSocket subscription when ws_url is set and falls back to
+    # eth_blockNumber polling, timed from the observed block cadence, while it is unavailable.
+    def __init__(self, rpc, ws_url=None, min_interval=1.0, max_interval=12.0, max_backoff=60.0,
+                 block_time=12.0, stall_timeout=60.0):
+        self.rpc = rpc
+        self.ws_url = ws_url
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.block_time = block_time
+        self.stall_timeout = stall_timeout
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.head = None
+        self.version = 0
+        self.changed_at = None
+        self.failures = 0
+        self.heads_seen = 0
+        self.polls = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.follow, name='head-tracker', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def wait(self, seen_version, timeout=None):
+        # Blocks until a head newer than seen_version arrives or timeout expires,
+        # then returns the current head and its version
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != seen_version, timeout)
+            return self.head, self.version
+
+    def publish(self, head):
+        with self.condition:
+            if self.head is not None and head['hash'] == self.head['hash']:
+                return
+            now = time.monotonic()
+            if self.head is not None and head['number'] > self.head['number'] and self.changed_at is not None:
+                # Exponentially weighted estimate of seconds per block
+                observed = (now - self.changed_at) / (head['number'] - self.head['number'])
+                self.block_time = 0.8 * self.block_time + 0.2 * observed
+            self.changed_at = now
+            self.head = head
+            self.version += 1
+            self.heads_seen += 1
+            self.condition.notify_all()
+
+    def backoff(self):
+        return min(self.min_interval * 2 ** self.failures, self.max_backoff)
+
+    def next_poll_delay(self):
+        # Sleeps until the next block is due, then polls every min_interval until it shows up
+        if self.changed_at is None:
+            return self.min_interval
+        due = self.changed_at + self.block_time - time.monotonic()
+        return min(max(due, self.min_interval), self.max_interval)
+
+    def follow(self):
+        while not self.stopped.is_set():
+            if not self.ws_url:
+                self.poll()
+                continue
+            try:
+                asyncio.run(self.subscribe())
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"newHeads subscription failed, polling for {self.backoff():.1f}s before reconnecting: {e}")
+            self.poll(until=time.monotonic() + self.backoff())
+
+    def poll(self, until=None):
+        while not self.stopped.is_set() and (until is None or time.monotonic() < until):
+            try:
+                self.polls += 1
+                block_number = self.rpc.get_block_number()
+                if self.head is None or block_number != self.head['number']:
+                    # Only a changed head costs a header fetch
+                    header = self.rpc.get_blocks([block_number], cached=False)[0]
+                    if header is not None:
+                        self.publish(header)
+                if until is None:
+                    self.failures = 0
+                delay = self.next_poll_delay()
+            except Exception as e:
+                if until is None:
+                    self.failures += 1
+                delay = self.backoff()
+                logger.error(f"Error polling chain head, retrying in {delay:.1f}s: {e}")
+            if until is not None:
+                delay = min(delay, max(until - time.monotonic(), 0))
+            self.stopped.wait(delay)
+
+    async def subscribe(self):
+        async with websockets.connect(self.ws_url) as ws:
+            await ws.send(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']}))
+            reply = json.loads(await asyncio.wait_for(ws.recv(), self.stall_timeout))
+            if 'error' in reply:
+                raise ValueError(reply['error'])
+            logger.info(f"Subscribed to newHeads as {reply.get('result')}")
+            self.failures = 0
+            while not self.stopped.is_set():
+                # A silent connection is treated as dead after stall_timeout
+                message = json.loads(await asyncio.wait_for(ws.recv(), self.stall_timeout))
+                if message.get('method') == 'eth_subscription':
+                    self.publish(format_result(message['params']['result']))
+
+    def stats(self):
+        return {
+            'head': self.head['number'] if self.head else None,
+            'heads_seen': self.heads_seen,
+            'polls': self.polls,
+            'block_time': self.block_time,
+            'mode': 'subscription' if self.ws_url else 'polling',
+        }
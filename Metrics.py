@@ -0,0 +1,315 @@
+import time
+import bisect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds per slot, used to estimate how long ago blocks behind head were produced
+SECONDS_PER_SLOT = 12
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    # One metric family in the Prometheus text exposition format, with optional labels.
+    # A callback set with set_function is evaluated on every scrape instead of stored values;
+    # it returns a number, or a dict of label value tuples to numbers.
+    type = 'untyped'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logger.debug(f"Metric callback for {self.name} failed: {e}")
+                return []
+            values = value if isinstance(value, dict) else {(): value}
+            return [(self.name, labels, value) for labels, value in values.items() if value is not None]
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            extra = labels[len(self.label_names):] if len(labels) > len(self.label_names) else ()
+            lines.append(f"{name}{format_labels(self.label_names, labels[:len(self.label_names)], extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, labels=()):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, labels=()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for labels, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", labels + (('le', format_value(float(bound))),), cumulative))
+                samples.append((f"{self.name}_bucket", labels + (('le', '+Inf'),), count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HEAD_BLOCK = REGISTRY.gauge('deposit_tracker_head_block', 'Latest chain head seen')
+LAST_PROCESSED_BLOCK = REGISTRY.gauge('deposit_tracker_last_processed_block', 'Last fully ingested block')
+HEAD_LAG_BLOCKS = REGISTRY.gauge('deposit_tracker_head_lag_blocks', 'Blocks between chain head and the last ingested block')
+HEAD_LAG_SECONDS = REGISTRY.gauge('deposit_tracker_head_lag_seconds', 'Seconds since the last ingested block was produced')
+STAGE_SECONDS = REGISTRY.histogram('deposit_tracker_stage_seconds', 'Latency of pipeline stages', ['stage'])
+RPC_ROUND_TRIPS = REGISTRY.counter('deposit_tracker_rpc_round_trips_total', 'JSON-RPC HTTP requests sent')
+RPC_CALLS = REGISTRY.counter('deposit_tracker_rpc_calls_total', 'JSON-RPC calls sent, counting each call in a batch')
+RPC_STATS = REGISTRY.gauge('deposit_tracker_rpc', 'RPC pool and cache statistics', ['stat'])
+RPC_ENDPOINT_LATENCY = REGISTRY.gauge('deposit_tracker_rpc_endpoint_latency_seconds', 'Smoothed latency per RPC endpoint', ['endpoint'])
+DB_TRANSACTIONS = REGISTRY.counter('deposit_tracker_db_transactions_total', 'Committed write transactions')
+DB_ROWS = REGISTRY.counter('deposit_tracker_db_rows_total', 'Rows written to MySQL')
+DEPOSITS = REGISTRY.counter('deposit_tracker_deposits_total', 'Deposits ingested')
+REORGS = REGISTRY.counter('deposit_tracker_reorgs_total', 'Chain reorganizations handled')
+REORG_DEPTH_BLOCKS = REGISTRY.histogram('deposit_tracker_reorg_depth_blocks', 'Blocks rolled back per reorg',
+                                        buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32, 64))
+NOTIFY_QUEUE_DEPTH = REGISTRY.gauge('deposit_tracker_notify_queue_depth', 'Block batches waiting in the notification queue')
+NOTIFICATIONS = REGISTRY.gauge('deposit_tracker_notifications', 'Notification dispatcher totals', ['result'])
+SINK_QUEUE_DEPTH = REGISTRY.gauge('deposit_tracker_sink_queue_depth', 'Events buffered per sink', ['sink'])
+SINK_EVENTS = REGISTRY.gauge('deposit_tracker_sink_events', 'Events per sink by outcome', ['sink', 'result'])
+
+
+def timed(stage):
+    # Records every call of the decorated function in STAGE_SECONDS under the given stage
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time((stage,)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_head(head_number, head_timestamp, last_block):
+    lag_blocks = max(head_number - last_block, 0)
+    HEAD_BLOCK.set(head_number)
+    LAST_PROCESSED_BLOCK.set(last_block)
+    HEAD_LAG_BLOCKS.set(lag_blocks)
+    # Blocks still behind head are estimated at one slot each
+    HEAD_LAG_SECONDS.set(max(time.time() - head_timestamp, 0.0) + lag_blocks * SECONDS_PER_SLOT)
+
+
+def watch_rpc(rpc):
+    RPC_STATS.set_function(lambda: {
+        (stat,): value for stat, value in rpc.stats().items()
+        if isinstance(value, (int, float)) and stat not in ('round_trips', 'calls')
+    })
+    RPC_ENDPOINT_LATENCY.set_function(lambda: {
+        (endpoint.uri,): endpoint.latency for endpoint in getattr(rpc, 'endpoints', ())
+    })
+
+
+def watch_sinks(sinks):
+    SINK_QUEUE_DEPTH.set_function(lambda: {(sink.name,): sink.stats()['queue_depth'] for sink in sinks})
+    SINK_EVENTS.set_function(lambda: {
+        (sink.name, result): value
+        for sink in sinks for result, value in sink.stats().items() if result != 'queue_depth'
+    })
+
+
+def watch_dispatcher(dispatcher):
+    NOTIFY_QUEUE_DEPTH.set_function(lambda: dispatcher.stats()['queue_depth'])
+    NOTIFICATIONS.set_function(lambda: {
+        (result,): dispatcher.stats()[result] for result in ('sent', 'failed', 'dropped')
+    })
+
+
+class LogRateLimiter:
+    # Per-item messages go to debug level through this: a message is only formatted when its
+    # level is enabled and the key's token bucket allows it, and the next message that gets
+    # through reports how many were suppressed in between
+    def __init__(self, logger, rate=1.0, burst=10):
+        self.logger = logger
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def debug(self, key, build_message):
+        self.log(logging.DEBUG, key, build_message)
+
+    def log(self, level, key, build_message):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, suppressed = self.buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, suppressed + 1)
+                return
+            self.buckets[key] = (tokens - 1, now, 0)
+        message = build_message()
+        if suppressed:
+            message += f" ({suppressed} similar messages suppressed)"
+        self.logger.log(level, message)
+
+
+class MetricsServer:
+    # Serves REGISTRY at /metrics and the sampling profiler's collapsed stacks at /profile.
+    # routes maps further path prefixes to callables taking (path, query) and returning
+    # (content_type, body); they answer 400 on ValueError and 404 on LookupError.
+    def __init__(self, port, host='127.0.0.1', registry=REGISTRY, profiler=None, routes=None):
+        registry_ref, profiler_ref, routes_ref = registry, profiler, dict(routes or {})
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                route = next((prefix for prefix in routes_ref if path.startswith(prefix)), None)
+                if path.startswith('/metrics'):
+                    body = registry_ref.render()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path.startswith('/profile') and profiler_ref is not None:
+                    body = profiler_ref.collapsed()
+                    content_type = 'text/plain; charset=utf-8'
+                elif route is not None:
+                    try:
+                        content_type, body = routes_ref[route](path, query)
+                    except ValueError as e:
+                        self.send_error(400, str(e))
+                        return
+                    except LookupError:
+                        self.send_error(404)
+                        return
+                    except Exception as e:
+                        logger.error(f"Error serving {path}: {e}")
+                        self.send_error(500)
+                        return
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def start_metrics_server(port, host='127.0.0.1', profiler=None, routes=None):
+    # Returns None when disabled (port 0) or when the port cannot be bound
+    if not port:
+        return None
+    try:
+        return MetricsServer(port, host, profiler=profiler, routes=routes).start()
+    except OSError as e:
+        logger.error(f"Could not start metrics server on {host}:{port}: {e}")
+        return None
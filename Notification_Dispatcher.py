@@ -0,0 +1,173 @@
+import time
+import asyncio
+import logging
+from Metrics import STAGE_SECONDS, LogRateLimiter
+
+logger = logging.getLogger(__name__)
+log_limiter = LogRateLimiter(logger)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        # At least one token, or rates below one per second could never be acquired
+        self.capacity = max(1, capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_after_seconds(error):
+    # python-telegram-bot reports RetryAfter.retry_after as seconds or as a timedelta
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        return None
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class NotificationDispatcher:
+    # Bounded queue of per-block deposit batches fanned out to a cached subscriber set
+    # under global and per-chat rate limits. Deposits from one block become one message per chat.
+    # Subscribers get every deposit; match(deposits), when given, returns chat id -> deposits for
+    # chats that only want some of them, such as watchlists.
+    def __init__(self, send, load_subscribers, format_message, max_queue=1000, concurrency=10,
+                 global_rate=30, per_chat_rate=1, max_retries=3, match=None):
+        self.send = send
+        self.load_subscribers = load_subscribers
+        self.format_message = format_message
+        self.match = match
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # Batch taken off the queue while coalescing that belongs to the next block
+        self.pending = None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.chat_buckets = {}
+        self.max_retries = max_retries
+        self.subscribers = None
+        self.task = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.send_time = 0.0
+        self.max_send_latency = 0.0
+
+    def start(self):
+        self.task = asyncio.create_task(self.consume())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def invalidate_subscribers(self):
+        self.subscribers = None
+
+    async def get_subscribers(self):
+        if self.subscribers is None:
+            self.subscribers = set(await self.load_subscribers())
+        return self.subscribers
+
+    def submit(self, deposits):
+        # Must be called on the event loop thread
+        by_block = {}
+        for deposit in deposits:
+            by_block.setdefault(deposit['blockNumber'], []).append(deposit)
+        for block_number, block_deposits in by_block.items():
+            try:
+                self.queue.put_nowait((block_number, block_deposits, time.monotonic()))
+            except asyncio.QueueFull:
+                self.dropped += len(block_deposits)
+                logger.error(f"Notification queue full, dropped {len(block_deposits)} deposits from block {block_number}")
+
+    async def consume(self):
+        while True:
+            if self.pending is not None:
+                (block_number, deposits, queued_at), self.pending = self.pending, None
+            else:
+                block_number, deposits, queued_at = await self.queue.get()
+            # Coalesce anything else already queued for the same block; the first batch of another
+            # block is held back and dispatched next, and marked done once it has been
+            while not self.queue.empty():
+                following = self.queue.get_nowait()
+                if following[0] != block_number:
+                    self.pending = following
+                    break
+                deposits.extend(following[1])
+                self.queue.task_done()
+            try:
+                await self.dispatch(block_number, deposits)
+            except Exception as e:
+                logger.error(f"Failed to dispatch notifications for block {block_number}: {e}")
+            finally:
+                self.queue.task_done()
+            log_limiter.debug('notified', lambda: f"Notified block {block_number} ({len(deposits)} deposits) "
+                                                  f"{time.monotonic() - queued_at:.2f}s after queueing, "
+                                                  f"queue depth {self.queue.qsize()}")
+
+    async def dispatch(self, block_number, deposits):
+        recipients = {chat_id: deposits for chat_id in await self.get_subscribers()}
+        if self.match:
+            for chat_id, matched in self.match(deposits).items():
+                recipients.setdefault(chat_id, matched)
+        if not recipients:
+            log_limiter.debug('recipients', lambda: f"No subscribers or watchers for block {block_number}")
+            return
+        # Chats receiving the same deposits share one formatted message
+        messages = {}
+        sends = []
+        for chat_id, chat_deposits in recipients.items():
+            key = tuple(map(id, chat_deposits))
+            if key not in messages:
+                messages[key] = self.format_message(block_number, chat_deposits)
+            sends.append(self.send_to_chat(chat_id, messages[key]))
+        await asyncio.gather(*sends)
+
+    async def send_to_chat(self, chat_id, message):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                started = time.monotonic()
+                try:
+                    await self.send(chat_id, message)
+                except Exception as e:
+                    delay = retry_after_seconds(e)
+                    if delay is not None and attempt < self.max_retries:
+                        logger.warning(f"Flood limit for chat_id {chat_id}, retrying after {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    self.failed += 1
+                    logger.error(f"Failed to send notification to chat_id {chat_id}: {e}")
+                    return
+                latency = time.monotonic() - started
+                STAGE_SECONDS.observe(latency, ('notify',))
+                self.sent += 1
+                self.send_time += latency
+                self.max_send_latency = max(self.max_send_latency, latency)
+                return
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize() + (self.pending is not None),
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'avg_send_latency': self.send_time / self.sent if self.sent else 0.0,
+            'max_send_latency': self.max_send_latency,
+        }
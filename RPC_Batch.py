@@ -0,0 +1,155 @@
+import time
+import threading
+import itertools
+import requests
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+from RPC_Cache import ResponseCache
+from Metrics import STAGE_SECONDS, RPC_ROUND_TRIPS, RPC_CALLS
+
+# Result fields that JSON-RPC returns as hex quantities
+QUANTITY_FIELDS = {
+    'number', 'timestamp', 'gas', 'gasPrice', 'gasUsed', 'gasLimit', 'blockNumber', 'transactionIndex',
+    'nonce', 'value', 'effectiveGasPrice', 'cumulativeGasUsed', 'status', 'logIndex', 'baseFeePerGas',
+    'size', 'type', 'chainId', 'maxFeePerGas', 'maxPriorityFeePerGas', 'v', 'difficulty', 'totalDifficulty',
+    'blobGasUsed', 'excessBlobGas'
+}
+
+# Result fields that JSON-RPC returns as hex byte strings
+BYTES_FIELDS = {
+    'hash', 'parentHash', 'blockHash', 'transactionHash', 'input', 'data', 'r', 's', 'logsBloom',
+    'stateRoot', 'receiptsRoot', 'transactionsRoot', 'sha3Uncles', 'mixHash', 'extraData'
+}
+
+
+def to_hex(value):
+    return '0x' + bytes(HexBytes(value)).hex()
+
+
+def format_result(value):
+    if isinstance(value, list):
+        return [format_result(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    formatted = {}
+    for key, item in value.items():
+        if key in QUANTITY_FIELDS and isinstance(item, str):
+            formatted[key] = int(item, 16)
+        elif key in BYTES_FIELDS and isinstance(item, str):
+            formatted[key] = HexBytes(item)
+        elif key == 'topics':
+            formatted[key] = [HexBytes(topic) for topic in item]
+        else:
+            formatted[key] = format_result(item)
+    return AttributeDict(formatted)
+
+
+class BatchRPC:
+    # Packs many JSON-RPC calls into batch requests of at most max_batch_size calls each.
+    # With cache_size set, block and receipt lookups are served from a ResponseCache.
+    def __init__(self, endpoint_uri, max_batch_size=20, timeout=30, cache_size=0):
+        self.endpoint_uri = endpoint_uri
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.round_trips = 0
+        self.calls = 0
+        self.cache = ResponseCache(cache_size) if cache_size else None
+
+    @property
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def post(self, payload):
+        response = self.session.post(self.endpoint_uri, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def call_many(self, calls):
+        # calls is a list of (method, params); results come back in the same order
+        results = []
+        for i in range(0, len(calls), self.max_batch_size):
+            results.extend(self.send_batch(calls[i:i + self.max_batch_size]))
+        return results
+
+    def send_batch(self, calls):
+        if not calls:
+            return []
+        payload = [
+            {'jsonrpc': '2.0', 'id': next(self.ids), 'method': method, 'params': params}
+            for method, params in calls
+        ]
+        started = time.perf_counter()
+        body = self.post(payload)
+        STAGE_SECONDS.observe(time.perf_counter() - started, ('rpc_fetch',))
+        self.round_trips += 1
+        self.calls += len(calls)
+        RPC_ROUND_TRIPS.inc()
+        RPC_CALLS.inc(len(calls))
+
+        if isinstance(body, dict):
+            # Providers that reject the batch as a whole answer with a single error object
+            raise ValueError(body.get('error', body))
+
+        by_id = {item.get('id'): item for item in body}
+        results = []
+        for request in payload:
+            item = by_id.get(request['id'])
+            if item is None:
+                raise ValueError(f"Missing response for {request['method']} {request['params']}")
+            if 'error' in item:
+                raise ValueError(f"{request['method']} {request['params']} failed: {item['error']}")
+            results.append(format_result(item.get('result')))
+        return results
+
+    def get_block_number(self):
+        return int(self.call_many([('eth_blockNumber', [])])[0], 16)
+
+    def cached_lookup(self, keys, cached, fetch, store):
+        # cached=False always asks the node (canonical-chain checks) but still refreshes the cache
+        if self.cache is None:
+            return fetch(keys)
+        found = self.cache.get_many(keys) if cached else {}
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            for key, result in zip(missing, fetch(missing)):
+                found[key] = result
+                if result is not None:
+                    store(result)
+        return [found.get(key) for key in keys]
+
+    def get_blocks(self, block_numbers, full_transactions=False, cached=True):
+        block_numbers = list(block_numbers)
+        return self.cached_lookup(
+            [('block', full_transactions, 'number', n) for n in block_numbers], cached,
+            lambda keys: self.call_many([('eth_getBlockByNumber', [hex(key[3]), full_transactions]) for key in keys]),
+            lambda block: self.cache.put_block(block, full_transactions)
+        )
+
+    def get_transactions(self, tx_hashes):
+        return self.call_many([('eth_getTransactionByHash', [to_hex(h)]) for h in tx_hashes])
+
+    def get_receipts(self, tx_hashes, cached=True):
+        return self.cached_lookup(
+            [('receipt', to_hex(h)) for h in tx_hashes], cached,
+            lambda keys: self.call_many([('eth_getTransactionReceipt', [key[1]]) for key in keys]),
+            lambda receipt: self.cache.put(('receipt', to_hex(receipt['transactionHash'])), receipt['blockNumber'], receipt)
+        )
+
+    def get_logs(self, params):
+        return self.call_many([('eth_getLogs', [params])])[0]
+
+    def forget_after(self, block_number):
+        # Called on reorg: number-keyed blocks and receipts above the ancestor may be orphaned
+        if self.cache is not None:
+            self.cache.forget_after(block_number)
+
+    def stats(self):
+        stats = {'round_trips': self.round_trips, 'calls': self.calls}
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        return stats
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    # LRU of block and receipt responses, keyed by block number and transaction hash. Both
+    # are only valid on the canonical chain, so forget_after drops them above a reorg's
+    # common ancestor.
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key][1]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put(self, key, block_number, value):
+        with self.lock:
+            self.entries[key] = (block_number, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def put_block(self, block, full_transactions):
+        self.put(('block', full_transactions, 'number', block['number']), block['number'], block)
+
+    def forget_after(self, block_number):
+        with self.lock:
+            stale = [key for key, (number, _) in self.entries.items() if number is not None and number > block_number]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def stats(self):
+        return {'cache_size': len(self.entries), 'cache_hits': self.hits,
+                'cache_misses': self.misses, 'cache_hit_rate': self.hit_rate}
@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from RPC_Batch import BatchRPC
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    # Health of one RPC endpoint: EWMA latency and error rate, plus a cooldown after failures
+    def __init__(self, uri):
+        self.uri = uri
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self.lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.error_rate *= 0.9
+
+    def record_failure(self):
+        with self.lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = 0.9 * self.error_rate + 0.1
+            self.down_until = time.monotonic() + min(2 ** self.consecutive_failures, 60)
+
+    def score(self):
+        # Lower is better; endpoints in cooldown sort last but stay usable as a last resort
+        down = time.monotonic() < self.down_until
+        return (down, (self.latency or 0.0) * (1 + 10 * self.error_rate))
+
+    def stats(self):
+        return {
+            'uri': self.uri,
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+
+class ProviderPool(BatchRPC):
+    # BatchRPC over several endpoints. Each request goes to the healthiest endpoint; if it has
+    # not answered after hedge_after seconds (or three times its usual latency, if longer) a
+    # duplicate goes to the next one and the first answer wins. Transport errors fail over to
+    # the remaining endpoints. JSON-RPC errors are answers, so they are never retried here.
+    # A pool without endpoints can be built, so modules that create one import cleanly; it raises
+    # on the first request instead.
+    def __init__(self, endpoint_uris, max_batch_size=20, timeout=15, hedge_after=1.0, cache_size=2048, workers=32):
+        super().__init__(endpoint_uris[0] if endpoint_uris else None, max_batch_size=max_batch_size, timeout=timeout, cache_size=cache_size)
+        self.endpoints = [Endpoint(uri) for uri in endpoint_uris]
+        self.hedge_after = hedge_after
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rpc')
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def session_for(self, endpoint):
+        # One keep-alive session per endpoint per thread
+        if not hasattr(self.local, 'sessions'):
+            self.local.sessions = {}
+        session = self.local.sessions.get(endpoint.uri)
+        if session is None:
+            session = self.local.sessions[endpoint.uri] = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+    def post_to(self, endpoint, payload):
+        started = time.monotonic()
+        try:
+            response = self.session_for(endpoint).post(endpoint.uri, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+        except Exception:
+            endpoint.record_failure()
+            raise
+        endpoint.record_success(time.monotonic() - started)
+        return body
+
+    def post(self, payload):
+        if not self.endpoints:
+            raise ValueError("No RPC endpoint configured, set ETH_RPC_URL or ETH_RPC_URLS")
+        candidates = sorted(self.endpoints, key=Endpoint.score)
+        pending = {}
+        last_error = None
+
+        def launch():
+            endpoint = candidates.pop(0)
+            pending[self.executor.submit(self.post_to, endpoint, payload)] = endpoint
+            return endpoint
+
+        primary = launch()
+        hedged = False
+        hedge_delay = None
+        if self.hedge_after:
+            hedge_delay = max(self.hedge_after, 3 * primary.latency) if primary.latency else self.hedge_after
+
+        while pending:
+            hedge = hedge_delay is not None and candidates and len(pending) == 1
+            done, _ = wait(pending, timeout=hedge_delay if hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                # Hedge at most once per request
+                self.hedges += 1
+                endpoint = launch()
+                hedged = True
+                hedge_delay = None
+                logger.debug(f"Hedging request to {endpoint.uri} after {primary.uri} was slow")
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    body = future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"RPC endpoint {endpoint.uri} failed: {e}")
+                    continue
+                if hedged and endpoint is not primary:
+                    self.hedge_wins += 1
+                return body
+            if not pending and candidates:
+                self.failovers += 1
+                launch()
+        raise last_error
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'failovers': self.failovers,
+            'endpoints': [endpoint.stats() for endpoint in self.endpoints],
+        })
+        return stats
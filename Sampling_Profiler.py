@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import logging
+import functools
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames of threads parked waiting for work; such stacks are only kept for section threads
+IDLE_FRAMES = {'threading.py:wait', 'selectors.py:select', 'queue.py:get', 'thread.py:_worker'}
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    # While any profiled section is running, a background thread samples the stacks of every
+    # thread each interval seconds and counts them as collapsed stacks ("a;b;c count"), the input
+    # format of flamegraph.pl and speedscope. Stacks are prefixed with the innermost section the
+    # thread is in, or with the thread name for other busy threads such as the pipeline's fetchers.
+    # With interval 0 a section only costs an attribute check.
+    def __init__(self, interval=0.0, max_stacks=20000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.sections = {}
+        self.stacks = Counter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def configure(self, interval):
+        self.interval = interval
+        if interval > 0:
+            logger.info(f"Sampling profiler enabled every {interval * 1000:.1f} ms")
+
+    def section(self, name):
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.interval:
+                    return function(*args, **kwargs)
+                self.enter(name)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.exit()
+            return wrapper
+        return decorate
+
+    def enter(self, name):
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.sections.setdefault(thread_id, []).append(name)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.sample_forever, name='profiler', daemon=True)
+                self.thread.start()
+
+    def exit(self):
+        thread_id = threading.get_ident()
+        with self.lock:
+            names = self.sections.get(thread_id)
+            if names:
+                names.pop()
+                if not names:
+                    del self.sections[thread_id]
+
+    def sample_forever(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval or 1.0)
+            with self.lock:
+                if not self.sections:
+                    continue
+                sections = {thread_id: names[-1] for thread_id, names in self.sections.items()}
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            collected = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                section = sections.get(thread_id)
+                if section is None and stack and stack[0] in IDLE_FRAMES:
+                    continue
+                prefix = section or names.get(thread_id, str(thread_id))
+                collected.append(';'.join([prefix] + stack[::-1]))
+            with self.lock:
+                self.samples += 1
+                for key in collected:
+                    if key in self.stacks or len(self.stacks) < self.max_stacks:
+                        self.stacks[key] += 1
+
+    def collapsed(self):
+        with self.lock:
+            return ''.join(f"{key} {count}\n" for key, count in self.stacks.most_common())
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.samples = 0
+
+
+# Shared by the tracker modules so sections can be declared with a decorator at class definition
+profiler = SamplingProfiler()
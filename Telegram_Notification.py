@@ -1,102 +1,185 @@
 import os
 import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from web3 import Web3
 from dotenv import load_dotenv
 import mysql.connector
-from eth_abi.abi import decode
+from Metrics import watch_dispatcher
+from Deposit_Rollups import rollup_summary
+from Deposit_Watchlist import WatchlistIndex, parse_targets
+from Notification_Dispatcher import NotificationDispatcher
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Ethereum node RPC URL (replace with your Alchemy or Infura URL)
-ETH_RPC_URL = os.getenv('ETH_RPC_URL')
+# Blocking MySQL calls made from Telegram handlers run on this many worker threads,
+# each holding its own connection, so the event loop never waits on the database
+DB_WORKERS = int(os.getenv('DB_WORKERS', '4'))
 
-# MySQL Database configuration
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME'),
-    'port': os.getenv('DB_PORT', '3306')  # Default MySQL port is 3306
-}
+# Notification fan-out: bounded queue, concurrent sends and Telegram's global and per-chat limits
+NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '1000'))
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '10'))
+NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', '30'))
+NOTIFY_PER_CHAT_RATE = float(os.getenv('NOTIFY_PER_CHAT_RATE', '1'))
+MAX_DEPOSITS_PER_MESSAGE = 25
 
-# Beacon Deposit Contract address
-BEACON_DEPOSIT_CONTRACT = '0x00000000219ab540356cBB839Cbe05303d7705Fa'
+# Watchlists: most pubkeys and withdrawal credentials one chat may watch, and the largest
+# file accepted for bulk import
+MAX_WATCHES_PER_CHAT = int(os.getenv('MAX_WATCHES_PER_CHAT', '10000'))
+MAX_IMPORT_BYTES = int(os.getenv('MAX_IMPORT_BYTES', '2000000'))
+WATCHLIST_PREVIEW = 20
 
 # Telegram configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
-# Initialize Web3
-w3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
 
-class DepositTracker:
-    def __init__(self):
+class TelegramSink:
+    # Engine sink that sends deposit notifications and serves the bot commands. The bot and the
+    # NotificationDispatcher run on an event loop in their own thread; the dispatcher's bounded
+    # queue is this sink's buffer, and it drops the newest batch when full. Reorg events are ignored.
+    # Subscribed chats get every deposit; other chats only get deposits matching their watchlist.
+    # stats() counts published events but sent and failed messages, one per subscribed chat.
+    name = 'telegram'
+
+    def __init__(self, db_config, token=TELEGRAM_BOT_TOKEN):
+        self.db_config = db_config
+        self.token = token
+        self.application = None
+        self.dispatcher = None
+        self.published = 0
+        self.watchlist = WatchlistIndex()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='telegram', daemon=True)
+        self.db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+        self.db_local = threading.local()
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.setup(), self.loop).result()
+
+    def stop(self, timeout=10):
+        if not self.thread.is_alive():
+            return
         try:
-            self.db = mysql.connector.connect(**DB_CONFIG)
-            self.cursor = self.db.cursor()
-            self.create_tables()
-            self.last_processed_block = self.get_last_processed_block()
-            self.application = None
-        except mysql.connector.Error as err:
-            logger.error(f"Error connecting to MySQL database: {err}")
-            raise
-
-    def create_tables(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Deposits (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                blockNumber INT,
-                blockTimestamp INT,
-                fee VARCHAR(255),
-                hash VARCHAR(66),
-                pubkey VARCHAR(132),
-                status ENUM('valid', 'invalid') DEFAULT 'valid',
-                created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                INDEX (hash),
-                INDEX (blockNumber)
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Processed_Blocks (
-                block_number INT PRIMARY KEY,
-                processed_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.cursor.execute('''
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Error shutting down Telegram sink: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.db_executor.shutdown(wait=False)
+
+    def publish(self, event):
+        if event['type'] != 'deposits' or self.dispatcher is None:
+            return
+        self.published += 1
+        self.loop.call_soon_threadsafe(self.dispatcher.submit, event['deposits'])
+
+    def stats(self):
+        stats = self.dispatcher.stats() if self.dispatcher else {}
+        return {
+            'queue_depth': stats.get('queue_depth', 0),
+            'published': self.published,
+            'sent': stats.get('sent', 0),
+            'dropped': stats.get('dropped', 0),
+            'failed': stats.get('failed', 0),
+        }
+
+    async def setup(self):
+        await self.run_db('''
             CREATE TABLE IF NOT EXISTS Telegram_Subscriptions (
                 chat_id BIGINT PRIMARY KEY,
                 subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        self.db.commit()
+        await self.run_db('''
+            CREATE TABLE IF NOT EXISTS Telegram_Watchlist (
+                chat_id BIGINT NOT NULL,
+                target VARCHAR(132) NOT NULL,
+                kind ENUM('pubkey', 'withdrawal_credentials') NOT NULL,
+                watched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, target)
+            )
+        ''')
+        self.watchlist.load(await self.run_db('SELECT chat_id, target FROM Telegram_Watchlist'))
+        logger.info(f"Loaded watchlists: {self.watchlist.stats()}")
+        await self.setup_telegram_bot()
+        self.dispatcher = NotificationDispatcher(
+            self.send_message, self.load_subscribers, self.format_notification,
+            max_queue=NOTIFY_QUEUE_SIZE, concurrency=NOTIFY_CONCURRENCY,
+            global_rate=NOTIFY_GLOBAL_RATE, per_chat_rate=NOTIFY_PER_CHAT_RATE,
+            match=self.watchlist.match
+        )
+        self.dispatcher.start()
+        watch_dispatcher(self.dispatcher)
+
+    async def shutdown(self):
+        if self.dispatcher:
+            await self.dispatcher.stop()
+        if self.application:
+            await self.application.updater.stop()
+            await self.application.stop()
+            await self.application.shutdown()
 
     async def setup_telegram_bot(self):
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        self.application = Application.builder().token(self.token).build()
         self.application.add_handler(CommandHandler("subscribe", self.subscribe))
         self.application.add_handler(CommandHandler("unsubscribe", self.unsubscribe))
         self.application.add_handler(CommandHandler("test_notification", self.test_notification))
+        self.application.add_handler(CommandHandler("stats", self.stats_command))
+        self.application.add_handler(CommandHandler("watch", self.watch))
+        self.application.add_handler(CommandHandler("unwatch", self.unwatch))
+        self.application.add_handler(CommandHandler("watchlist", self.show_watchlist))
+        # Files are only imported when sent privately or captioned /watch, not every document posted in a group
+        self.application.add_handler(MessageHandler(
+            filters.Document.ALL & (filters.ChatType.PRIVATE | filters.CaptionRegex(r'^/watch\b')),
+            self.import_watchlist
+        ))
         await self.application.initialize()
         await self.application.start()
         await self.application.updater.start_polling()
         logger.info("Telegram bot setup completed")
 
+    def worker_connection(self):
+        db = getattr(self.db_local, 'db', None)
+        if db is None or not db.is_connected():
+            db = mysql.connector.connect(**self.db_config)
+            self.db_local.db = db
+        return db
+
+    def execute_db(self, query, params=(), many=False):
+        db = self.worker_connection()
+        cursor = db.cursor()
+        try:
+            if many:
+                cursor.executemany(query, params)
+                rows = None
+            else:
+                cursor.execute(query, params)
+                rows = cursor.fetchall() if cursor.with_rows else None
+            db.commit()
+            return rows
+        finally:
+            cursor.close()
+
+    async def run_db(self, query, params=(), many=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, self.execute_db, query, params, many)
+
     async def subscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
         try:
-            self.cursor.execute('''
+            await self.run_db('''
                 INSERT INTO Telegram_Subscriptions (chat_id)
                 VALUES (%s)
                 ON DUPLICATE KEY UPDATE subscribed_at = CURRENT_TIMESTAMP
             ''', (chat_id,))
-            self.db.commit()
+            self.dispatcher.invalidate_subscribers()
             await update.message.reply_text("You have successfully subscribed to deposit notifications!")
             logger.info(f"User {chat_id} subscribed to notifications")
         except Exception as e:
@@ -106,8 +189,8 @@ class DepositTracker:
     async def unsubscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
         try:
-            self.cursor.execute('DELETE FROM Telegram_Subscriptions WHERE chat_id = %s', (chat_id,))
-            self.db.commit()
+            await self.run_db('DELETE FROM Telegram_Subscriptions WHERE chat_id = %s', (chat_id,))
+            self.dispatcher.invalidate_subscribers()
             await update.message.reply_text("You have been unsubscribed from deposit notifications.")
             logger.info(f"User {chat_id} unsubscribed from notifications")
         except Exception as e:
@@ -124,167 +207,158 @@ class DepositTracker:
             logger.error(f"Failed to send test notification: {e}")
             await update.message.reply_text("Failed to send test notification. Please check the logs.")
 
-    def get_last_processed_block(self):
-        self.cursor.execute('SELECT MAX(block_number) FROM Processed_Blocks')
-        result = self.cursor.fetchone()
-        if result[0]:
-            return result[0]
-        else:
-            # If no blocks have been processed, start from 100 blocks ago
-            latest_block = w3.eth.get_block('latest')['number']
-            return latest_block - 100
-
-    def save_processed_block(self, block_number):
-        self.cursor.execute('''
-            INSERT INTO Processed_Blocks (block_number) 
-            VALUES (%s) 
-            ON DUPLICATE KEY UPDATE processed_timestamp = CURRENT_TIMESTAMP
-        ''', (block_number,))
-        self.db.commit()
-
-    def save_deposit(self, deposit):
-        self.cursor.execute('''
-            INSERT INTO deposits (blockNumber, blockTimestamp, fee, hash, pubkey)
-            VALUES (%s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-                blockNumber = %s, 
-                blockTimestamp = %s, 
-                fee = %s, 
-                pubkey = %s
-        ''', (
-            deposit['blockNumber'], deposit['blockTimestamp'], deposit['fee'], deposit['hash'], deposit['pubkey'],
-            deposit['blockNumber'], deposit['blockTimestamp'], deposit['fee'], deposit['pubkey']
-        ))
-        self.db.commit()
-        logger.info(f"Saved Deposit: {deposit['hash']}")
-        asyncio.create_task(self.send_notification(deposit))
-        logger.info(f"Created task to send notification for deposit: {deposit['hash']}")
-
-    def invalidate_deposit(self, tx_hash):
-        self.cursor.execute('''
-            UPDATE Deposits 
-            SET status = 'invalid' 
-            WHERE hash = %s
-        ''', (tx_hash,))
-        self.db.commit()
-        logger.info(f"Invalidated Deposit: {tx_hash}")
-
-    def extract_pubkey(self, input_data):
+    async def watch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not context.args:
+            await update.message.reply_text("Usage: /watch <pubkey or withdrawal credentials> [...]\n"
+                                            "To import many at once, send a text or CSV file of them here, "
+                                            "or captioned /watch in a group.")
+            return
+        await self.add_watches(update, ' '.join(context.args))
+
+    async def import_watchlist(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        document = update.message.document
+        if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+            await update.message.reply_text(f"File too large, the limit is {MAX_IMPORT_BYTES} bytes.")
+            return
         try:
-            decoded = decode(['bytes', 'bytes', 'bytes', 'bytes32'], bytes.fromhex(input_data[2:]))
-            return '0x' + decoded[0].hex()
+            file = await document.get_file()
+            data = await file.download_as_bytearray()
         except Exception as e:
-            logger.error(f"Error decoding pubkey: {e}")
-            return None
+            logger.error(f"Error downloading watchlist file: {e}")
+            await update.message.reply_text("Could not download the file. Please try again later.")
+            return
+        await self.add_watches(update, bytes(data).decode('utf-8', errors='replace'))
 
-    def process_block(self, block_number):
+    async def add_watches(self, update, text):
+        chat_id = update.effective_chat.id
+        targets, invalid = parse_targets(text)
+        if not targets:
+            await update.message.reply_text("No validator pubkeys (96 hex characters) or withdrawal "
+                                            "credentials (64 hex characters) found.")
+            return
+        watched = self.watchlist.targets_of(chat_id)
+        new = [(kind, target) for kind, target in targets if target not in watched]
+        if len(watched) + len(new) > MAX_WATCHES_PER_CHAT:
+            await update.message.reply_text(f"A chat can watch at most {MAX_WATCHES_PER_CHAT} keys; "
+                                            f"you watch {len(watched)} and tried to add {len(new)}.")
+            return
         try:
-            block = w3.eth.get_block(block_number, full_transactions=True)
-            
-            for tx in block['transactions']:
-                try:
-                    if tx['to'] is not None and tx['to'].lower() == BEACON_DEPOSIT_CONTRACT.lower():
-                        deposit = {
-                            'blockNumber': block_number,
-                            'blockTimestamp': block['timestamp'],
-                            'fee': str(tx['gas'] * tx['gasPrice']),
-                            'hash': tx['hash'].hex(),
-                            'pubkey': self.extract_pubkey(tx['input'])
-                        }
-                        self.save_deposit(deposit)
-                except Exception as e:
-                    logger.error(f"Error processing transaction {tx.get('hash', 'Unknown')}: {e}")
-            
-            self.save_processed_block(block_number)
-            logger.info(f"Processed and Saved Block {block_number}")
+            if new:
+                await self.run_db('''
+                    INSERT IGNORE INTO Telegram_Watchlist (chat_id, target, kind)
+                    VALUES (%s, %s, %s)
+                ''', [(chat_id, target, kind) for kind, target in new], many=True)
+                self.watchlist.add(chat_id, [target for _, target in new])
+            total = len(self.watchlist.targets_of(chat_id))
+            reply = f"Now watching {len(new)} new keys ({total} in total)."
+            if len(targets) > len(new):
+                reply += f" {len(targets) - len(new)} were already watched."
+            if invalid:
+                reply += f" Skipped {len(invalid)} entries that are not pubkeys or withdrawal credentials."
+            await update.message.reply_text(reply)
+            logger.info(f"Chat {chat_id} now watches {total} keys")
         except Exception as e:
-            logger.error(f"Error processing block {block_number}: {e}")
-
-    def handle_reorg(self, new_block_number):
-        check_depth = 10
-        start_block = max(new_block_number - check_depth, self.last_processed_block)
-        
-        for block_number in range(start_block, new_block_number + 1):
-            try:
-                block = w3.eth.get_block(block_number)
-                self.cursor.execute('SELECT hash FROM Deposits WHERE blockNumber = %s', (block_number,))
-                deposits = self.cursor.fetchall()
-                
-                for deposit in deposits:
-                    tx_hash = deposit[0]
-                    try:
-                        tx = w3.eth.get_transaction(tx_hash)
-                        if tx['blockNumber'] != block_number:
-                            logger.warning(f"Reorg detected for transaction {tx_hash}")
-                            self.invalidate_deposit(tx_hash)
-                    except Exception:
-                        logger.warning(f"Transaction {tx_hash} not found, likely due to reorg")
-                        self.invalidate_deposit(tx_hash)
-                
-                self.db.commit()
-                self.process_block(block_number)
-            except Exception as e:
-                logger.error(f"Error handling reorg for block {block_number}: {e}")
-
-    async def send_notification(self, deposit):
-        if not self.application:
-            logger.error("Telegram application not initialized")
+            logger.error(f"Error adding watches: {e}")
+            await update.message.reply_text("An error occurred while updating your watchlist. Please try again later.")
+
+    async def unwatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        if not context.args:
+            await update.message.reply_text("Usage: /unwatch <pubkey or withdrawal credentials> [...] or /unwatch all")
             return
+        try:
+            if context.args == ['all']:
+                removed = len(self.watchlist.targets_of(chat_id))
+                await self.run_db('DELETE FROM Telegram_Watchlist WHERE chat_id = %s', (chat_id,))
+                self.watchlist.remove_chat(chat_id)
+            else:
+                targets, _ = parse_targets(' '.join(context.args))
+                watched = self.watchlist.targets_of(chat_id)
+                stale = [target for _, target in targets if target in watched]
+                if stale:
+                    await self.run_db('DELETE FROM Telegram_Watchlist WHERE chat_id = %s AND target = %s',
+                                      [(chat_id, target) for target in stale], many=True)
+                    self.watchlist.remove(chat_id, stale)
+                removed = len(stale)
+            await update.message.reply_text(f"Stopped watching {removed} keys "
+                                            f"({len(self.watchlist.targets_of(chat_id))} still watched).")
+            logger.info(f"Chat {chat_id} stopped watching {removed} keys")
+        except Exception as e:
+            logger.error(f"Error removing watches: {e}")
+            await update.message.reply_text("An error occurred while updating your watchlist. Please try again later.")
+
+    async def show_watchlist(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        watched = sorted(self.watchlist.targets_of(update.effective_chat.id))
+        if not watched:
+            await update.message.reply_text("You are not watching any keys. Use /watch to add some.")
+            return
+        lines = [f"Watching {len(watched)} keys:"]
+        lines += [f"{target[:10]}...{target[-10:]}" for target in watched[:WATCHLIST_PREVIEW]]
+        if len(watched) > WATCHLIST_PREVIEW:
+            lines.append(f"...and {len(watched) - WATCHLIST_PREVIEW} more")
+        await update.message.reply_text("\n".join(lines))
+
+    def query_summary(self):
+        db = self.worker_connection()
+        cursor = db.cursor()
+        try:
+            summary = rollup_summary(cursor)
+            db.commit()
+            return summary
+        finally:
+            cursor.close()
 
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
-            message = f"New Deposit Detected!\n\n" \
-                      f"Block Number: {deposit['blockNumber']}\n" \
-                      f"Transaction Hash: {deposit['hash']}\n" \
-                      f"Public Key: {deposit['pubkey'][:10]}...{deposit['pubkey'][-10:]}\n" \
-                      f"Fee: {Web3.from_wei(int(deposit['fee']), 'ether'):.6f} ETH"
-            
-            logger.info(f"Preparing to send notification for deposit: {deposit['hash']}")
-            
-            self.cursor.execute('SELECT chat_id FROM Telegram_Subscriptions')
-            subscribers = self.cursor.fetchall()
-            
-            if not subscribers:
-                logger.warning("No subscribers found for notifications")
-                return
-
-            logger.info(f"Found {len(subscribers)} subscribers")
-
-            for (chat_id,) in subscribers:
-                try:
-                    logger.info(f"Attempting to send notification to chat_id: {chat_id}")
-                    await self.application.bot.send_message(chat_id=chat_id, text=message)
-                    logger.info(f"Notification sent successfully to chat_id: {chat_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send notification to chat_id {chat_id}: {e}")
-            
-            logger.info(f"Completed sending Telegram notifications for deposit: {deposit['hash']}")
+            loop = asyncio.get_running_loop()
+            summary = await loop.run_in_executor(self.db_executor, self.query_summary)
+            await update.message.reply_text(self.format_stats(summary))
         except Exception as e:
-            logger.error(f"Failed to send Telegram notifications: {e}")
-
-    async def run(self):
-        while True:
-            try:
-                current_block = w3.eth.get_block('latest')['number']
-                
-                if current_block > self.last_processed_block:
-                    self.handle_reorg(current_block)
-                
-                while self.last_processed_block < current_block:
-                    self.last_processed_block += 1
-                    self.process_block(self.last_processed_block)
-                
-                await asyncio.sleep(15)  # Wait for 15 seconds before checking for new blocks
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                await asyncio.sleep(60)  # Wait for 1 minute before retrying in case of a major error
-
-async def main():
-    try:
-        tracker = DepositTracker()
-        await tracker.setup_telegram_bot()
-        await tracker.run()
-    except Exception as e:
-        logger.error(f"Failed to initialize or run DepositTracker: {e}")
+            logger.error(f"Error fetching deposit stats: {e}")
+            await update.message.reply_text("An error occurred while fetching stats. Please try again later.")
+
+    def format_stats(self, summary):
+        lines = ["Deposit Stats (UTC)\n"]
+        for name, label in (('current_hour', 'This hour'), ('previous_hour', 'Last hour'),
+                            ('today', 'Today'), ('yesterday', 'Yesterday'), ('total', 'All time')):
+            row = summary[name]
+            lines.append(f"{label}: {row['deposits']} deposits, "
+                         f"{Web3.from_wei(row['amount_gwei'], 'gwei'):.2f} ETH, "
+                         f"{row['distinct_pubkeys']} validators, "
+                         f"fees {Web3.from_wei(row['fee_wei'], 'ether'):.6f} ETH")
+        latest = summary['latest_block']
+        if latest:
+            lines.append(f"\nLatest deposit block: {latest['bucket']} ({latest['deposits']} deposits)")
+        return "\n".join(lines)
+
+    async def load_subscribers(self):
+        return [chat_id for (chat_id,) in await self.run_db('SELECT chat_id FROM Telegram_Subscriptions')]
+
+    async def send_message(self, chat_id, text):
+        await self.application.bot.send_message(chat_id=chat_id, text=text)
+
+    def format_notification(self, block_number, deposits):
+        if len(deposits) == 1:
+            deposit = deposits[0]
+            pubkey = deposit['pubkey'] or 'unknown'
+            return f"New Deposit Detected!\n\n" \
+                   f"Block Number: {block_number}\n" \
+                   f"Transaction Hash: {deposit['hash']}\n" \
+                   f"Public Key: {pubkey[:10]}...{pubkey[-10:]}\n" \
+                   f"Amount: {Web3.from_wei(deposit['amount_gwei'], 'gwei'):.4f} ETH\n" \
+                   f"Fee: {Web3.from_wei(int(deposit['fee']), 'ether'):.6f} ETH"
+
+        # Telegram caps messages at 4096 characters, so long blocks are summarized
+        lines = [f"{len(deposits)} New Deposits Detected in Block {block_number}!\n"]
+        for deposit in deposits[:MAX_DEPOSITS_PER_MESSAGE]:
+            pubkey = deposit['pubkey'] or 'unknown'
+            lines.append(f"{deposit['hash']} | {pubkey[:10]}...{pubkey[-10:]} | "
+                         f"{Web3.from_wei(int(deposit['fee']), 'ether'):.6f} ETH")
+        if len(deposits) > MAX_DEPOSITS_PER_MESSAGE:
+            lines.append(f"...and {len(deposits) - MAX_DEPOSITS_PER_MESSAGE} more")
+        return "\n".join(lines)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # Same engine as ETH_Deposit_Tracker.py with the Telegram sink always enabled
+    from ETH_Deposit_Tracker import main, SINKS
+    main(SINKS if 'telegram' in SINKS else SINKS + ['telegram'])
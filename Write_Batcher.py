@@ -0,0 +1,128 @@
+import time
+import logging
+from Block_Range_Index import load_ranges, save_range
+from Deposit_Rollups import replace_legacy_deposits, newly_valid, apply_deposits
+from Metrics import STAGE_SECONDS, DB_TRANSACTIONS, DB_ROWS, LogRateLimiter
+
+logger = logging.getLogger(__name__)
+log_limiter = LogRateLimiter(logger)
+
+INSERT_DEPOSIT = '''
+    INSERT INTO Deposits (blockNumber, blockTimestamp, fee, hash, logIndex, pubkey,
+                          withdrawal_credentials, amount_gwei, signature, deposit_index)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        blockNumber = VALUES(blockNumber),
+        blockTimestamp = VALUES(blockTimestamp),
+        fee = VALUES(fee),
+        pubkey = VALUES(pubkey),
+        withdrawal_credentials = VALUES(withdrawal_credentials),
+        amount_gwei = VALUES(amount_gwei),
+        signature = VALUES(signature),
+        deposit_index = VALUES(deposit_index),
+        status = 'valid'
+'''
+
+INSERT_PROCESSED_BLOCK = '''
+    INSERT INTO Processed_Blocks (block_number, block_hash, parent_hash)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        processed_timestamp = CURRENT_TIMESTAMP,
+        block_hash = VALUES(block_hash),
+        parent_hash = VALUES(parent_hash)
+'''
+
+
+class WriteBatcher:
+    # Buffers deposit rows and processed-block markers and writes them in one transaction.
+    # A block marker is only buffered after its deposits, so a flush can never commit a
+    # processed block without the deposits it contained. Markers are merged into
+    # Processed_Ranges; only blocks with a known hash get a Processed_Blocks row, and
+    # those rows are pruned to the most recent hash_retention blocks. Deposit rollups are
+    # updated in the same transaction, counting only deposits that were not already valid, after
+    # pre-logIndex rows for the same transactions are replaced.
+    def __init__(self, db, range_index, max_rows=500, max_delay=2.0, hash_retention=64, on_flush=None):
+        self.db = db
+        self.cursor = db.cursor()
+        self.range_index = range_index
+        self.hash_retention = hash_retention
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.on_flush = on_flush
+        self.deposits = []
+        self.blocks = []
+        self.spans = []
+        self.oldest = None
+        self.rows_written = 0
+        self.transactions = 0
+        self.write_time = 0.0
+
+    @property
+    def pending(self):
+        return len(self.deposits) + len(self.blocks) + len(self.spans)
+
+    @property
+    def rows_per_second(self):
+        return self.rows_written / self.write_time if self.write_time else 0.0
+
+    def add_deposit(self, deposit):
+        self.deposits.append(deposit)
+        self.maybe_flush()
+
+    def add_block(self, block_number, block_hash=None, parent_hash=None):
+        if block_hash is not None:
+            self.blocks.append((block_number, block_hash, parent_hash))
+        if self.spans and self.spans[-1][1] == block_number - 1:
+            self.spans[-1][1] = block_number
+        else:
+            self.spans.append([block_number, block_number])
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if self.pending >= self.max_rows or time.monotonic() - self.oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        deposits, blocks, spans = self.deposits, self.blocks, self.spans
+        self.deposits, self.blocks, self.spans, self.oldest = [], [], [], None
+
+        started = time.monotonic()
+        try:
+            if deposits:
+                replace_legacy_deposits(self.cursor, deposits)
+                fresh = newly_valid(self.cursor, deposits)
+                self.cursor.executemany(INSERT_DEPOSIT, [
+                    (d['blockNumber'], d['blockTimestamp'], d['fee'], d['hash'], d['logIndex'], d['pubkey'],
+                     d['withdrawal_credentials'], d['amount_gwei'], d['signature'], d['deposit_index'])
+                    for d in deposits
+                ])
+                apply_deposits(self.cursor, fresh)
+            if blocks:
+                self.cursor.executemany(INSERT_PROCESSED_BLOCK, blocks)
+                self.cursor.execute('DELETE FROM Processed_Blocks WHERE block_number <= %s',
+                                    (blocks[-1][0] - self.hash_retention,))
+            for start, end in spans:
+                save_range(self.cursor, self.range_index, start, end)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            load_ranges(self.cursor, self.range_index)
+            raise
+
+        elapsed = time.monotonic() - started
+        rows = len(deposits) + len(blocks) + len(spans)
+        self.rows_written += rows
+        self.transactions += 1
+        self.write_time += elapsed
+        STAGE_SECONDS.observe(elapsed, ('db_write',))
+        DB_TRANSACTIONS.inc()
+        DB_ROWS.inc(rows)
+        log_limiter.debug('flush', lambda: f"Flushed {len(deposits)} deposits and {sum(e - s + 1 for s, e in spans)} blocks "
+                                           f"in {elapsed * 1000:.1f} ms ({self.rows_per_second:.0f} rows/sec overall)")
+
+        if self.on_flush and deposits:
+            self.on_flush(deposits)
@@ -0,0 +1,55 @@
+import os
+import sys
+import timeit
+from eth_abi import encode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Deposit_Decoder import (
+    DEPOSIT_SELECTOR, decode_deposit_logs, decode_deposit_log_generic,
+    decode_deposit_calldatas, decode_deposit_calldata_generic
+)
+
+BATCH_SIZE = 1000
+REPEAT = 5
+
+
+def synthetic_log(i):
+    return encode(['bytes', 'bytes', 'bytes', 'bytes', 'bytes'], [
+        bytes([i % 256]) * 48,
+        b'\x01' + bytes(11) + bytes([i % 256]) * 20,
+        (32 * 10**9).to_bytes(8, 'little'),
+        bytes([i % 256]) * 96,
+        i.to_bytes(8, 'little'),
+    ])
+
+
+def synthetic_calldata(i):
+    return DEPOSIT_SELECTOR + encode(['bytes', 'bytes', 'bytes', 'bytes32'], [
+        bytes([i % 256]) * 48,
+        b'\x01' + bytes(11) + bytes([i % 256]) * 20,
+        bytes([i % 256]) * 96,
+        bytes(32),
+    ])
+
+
+def measure(name, fn):
+    best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+    print(f"{name:<28} {best * 1000:8.2f} ms  {BATCH_SIZE / best:12.0f} deposits/sec")
+    return best
+
+
+if __name__ == "__main__":
+    logs = [synthetic_log(i) for i in range(BATCH_SIZE)]
+    calldatas = [synthetic_calldata(i) for i in range(BATCH_SIZE)]
+
+    assert decode_deposit_logs(logs) == [decode_deposit_log_generic(data) for data in logs]
+    assert decode_deposit_calldatas(calldatas) == [decode_deposit_calldata_generic(data) for data in calldatas]
+
+    print(f"Decoding {BATCH_SIZE} deposits, best of {REPEAT}")
+    generic = measure("DepositEvent generic ABI", lambda: [decode_deposit_log_generic(data) for data in logs])
+    fast = measure("DepositEvent fixed layout", lambda: decode_deposit_logs(logs))
+    print(f"{'speedup':<28} {generic / fast:8.1f}x")
+    generic = measure("calldata generic ABI", lambda: [decode_deposit_calldata_generic(data) for data in calldatas])
+    fast = measure("calldata fixed layout", lambda: decode_deposit_calldatas(calldatas))
+    print(f"{'speedup':<28} {generic / fast:8.1f}x")
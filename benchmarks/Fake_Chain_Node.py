@@ -0,0 +1,274 @@
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from eth_abi import encode
+
+# keccak256("DepositEvent(bytes,bytes,bytes,bytes,bytes)")
+DEPOSIT_EVENT_TOPIC = '0x649bbc62d0e31342afea4e5cd82d4049e7e1ee912fc0889aa790803be39038c5'
+DEPOSIT_CONTRACT = '0x00000000219ab540356cbb839cbe05303d7705fa'
+FILLER_CONTRACT = '0x000000000000000000000000000000000000dead'
+BLOCK_TIME = 12
+
+
+def digest(*parts):
+    return '0x' + hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def deposit_log_data(seed, deposit_index):
+    key = bytes.fromhex(digest('key', seed, deposit_index)[2:])
+    return '0x' + encode(['bytes', 'bytes', 'bytes', 'bytes', 'bytes'], [
+        (key * 2)[:48],
+        b'\x01' + bytes(11) + key[:20],
+        (32 * 10**9).to_bytes(8, 'little'),
+        (key * 3),
+        deposit_index.to_bytes(8, 'little'),
+    ]).hex()
+
+
+class FakeChain:
+    # Deterministic synthetic chain: block n on fork f always has the same hash, transactions and
+    # DepositEvent logs. Reorgs replace the newest blocks with a new fork; every block, transaction
+    # and receipt ever produced stays retrievable by hash, as on a real node.
+    def __init__(self, seed=0, start_block=20000000, deposits_every=4, deposits_per_block=1,
+                 filler_txs=3, max_logs=10000):
+        self.seed = seed
+        self.start_block = start_block
+        self.deposits_every = deposits_every
+        self.deposits_per_block = deposits_per_block
+        self.filler_txs = filler_txs
+        self.max_logs = max_logs
+        self.lock = threading.RLock()
+        self.canonical = []
+        self.blocks_by_hash = {}
+        self.transactions = {}
+        self.receipts = {}
+        self.forks = 0
+        self.reorgs = 0
+        self.deposit_count = 0
+        self.produced_at = {}
+
+    def head(self):
+        with self.lock:
+            return self.start_block + len(self.canonical) - 1
+
+    def deposits_for(self, block_number):
+        return self.deposits_per_block if block_number % self.deposits_every == 0 else 0
+
+    def mine(self, count=1, deposits=None):
+        with self.lock:
+            for _ in range(count):
+                self.canonical.append(self.make_block(self.head() + 1, deposits))
+                self.produced_at[self.head()] = time.monotonic()
+        return self.head()
+
+    def reorg(self, depth, extra=1):
+        # Replaces the newest depth blocks with a new fork that is extra blocks longer
+        with self.lock:
+            depth = min(depth, len(self.canonical) - 1)
+            del self.canonical[len(self.canonical) - depth:]
+            self.forks += 1
+            self.reorgs += 1
+            return self.mine(depth + extra)
+
+    def make_block(self, number, deposits=None):
+        parent = self.canonical[-1]['hash'] if self.canonical else digest('genesis', self.seed)
+        block_hash = digest('block', self.seed, self.forks, number)
+        transactions = []
+        logs = []
+        count = self.deposits_for(number) if deposits is None else deposits
+        for i in range(count + self.filler_txs):
+            is_deposit = i < count
+            tx = {
+                'hash': digest('tx', self.seed, self.forks, number, i),
+                'blockHash': block_hash,
+                'blockNumber': hex(number),
+                'transactionIndex': hex(i),
+                'from': '0x' + digest('sender', i)[2:42],
+                'to': DEPOSIT_CONTRACT if is_deposit else FILLER_CONTRACT,
+                'gas': hex(90000),
+                'gasPrice': hex(20 * 10**9 + i),
+                'value': hex(32 * 10**18 if is_deposit else 0),
+                'nonce': hex(number),
+                'input': '0x22895118' if is_deposit else '0x',
+                'type': '0x0',
+            }
+            receipt = {
+                'transactionHash': tx['hash'],
+                'transactionIndex': tx['transactionIndex'],
+                'blockHash': block_hash,
+                'blockNumber': hex(number),
+                'status': '0x1',
+                'gasUsed': hex(60000),
+                'logs': [],
+            }
+            if is_deposit:
+                log = {
+                    'address': DEPOSIT_CONTRACT,
+                    'topics': [DEPOSIT_EVENT_TOPIC],
+                    'data': deposit_log_data(self.seed, self.deposit_count),
+                    'blockNumber': hex(number),
+                    'blockHash': block_hash,
+                    'transactionHash': tx['hash'],
+                    'transactionIndex': tx['transactionIndex'],
+                    'logIndex': hex(len(logs)),
+                    'removed': False,
+                }
+                self.deposit_count += 1
+                logs.append(log)
+                receipt['logs'].append(log)
+            self.transactions[tx['hash']] = tx
+            self.receipts[tx['hash']] = receipt
+            transactions.append(tx)
+        block = {
+            'number': hex(number),
+            'hash': block_hash,
+            'parentHash': parent,
+            'timestamp': hex(1700000000 + number * BLOCK_TIME),
+            'gasLimit': hex(30000000),
+            'gasUsed': hex(60000 * len(transactions)),
+            'baseFeePerGas': hex(10 * 10**9),
+            'miner': FILLER_CONTRACT,
+            'transactions': transactions,
+            'logs': logs,
+        }
+        self.blocks_by_hash[block_hash] = block
+        return block
+
+    def block_json(self, block, full_transactions):
+        result = {key: value for key, value in block.items() if key != 'logs'}
+        if not full_transactions:
+            result['transactions'] = [tx['hash'] for tx in block['transactions']]
+        return result
+
+    def block_by_number(self, number, full_transactions=False):
+        with self.lock:
+            if number == 'latest':
+                number = self.head()
+            index = int(number, 16) - self.start_block if isinstance(number, str) else number - self.start_block
+            if 0 <= index < len(self.canonical):
+                return self.block_json(self.canonical[index], full_transactions)
+            return None
+
+    def block_by_hash(self, block_hash, full_transactions=False):
+        with self.lock:
+            block = self.blocks_by_hash.get(block_hash.lower())
+            return self.block_json(block, full_transactions) if block else None
+
+    def get_logs(self, params):
+        with self.lock:
+            start = int(params['fromBlock'], 16) if isinstance(params['fromBlock'], str) else params['fromBlock']
+            end = int(params['toBlock'], 16) if isinstance(params['toBlock'], str) else params['toBlock']
+            address = params.get('address', '').lower()
+            topics = params.get('topics') or []
+            logs = []
+            for block in self.canonical[max(0, start - self.start_block):max(0, end - self.start_block + 1)]:
+                for log in block['logs']:
+                    if address and log['address'] != address:
+                        continue
+                    if topics and topics[0] and log['topics'][0] != topics[0]:
+                        continue
+                    logs.append(log)
+            if len(logs) > self.max_logs:
+                raise RPCError(-32005, f"query returned more than {self.max_logs} results")
+            return logs
+
+    def canonical_deposits(self, start_block, end_block):
+        # (tx_hash, logIndex) of every deposit on the canonical chain in [start_block, end_block]
+        with self.lock:
+            return {
+                (log['transactionHash'], int(log['logIndex'], 16))
+                for block in self.canonical[start_block - self.start_block:end_block - self.start_block + 1]
+                for log in block['logs']
+            }
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeNode:
+    # Threaded JSON-RPC server over a FakeChain with a fixed latency per HTTP request
+    def __init__(self, chain, latency=0.0, host='127.0.0.1', port=0):
+        self.chain = chain
+        self.latency = latency
+        # HTTP status every request gets instead of an answer while set, as from an overloaded node
+        self.error_status = None
+        self.requests = 0
+        self.calls = 0
+        self.counter_lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if node.error_status:
+                    self.send_error(node.error_status)
+                    return
+                if node.latency:
+                    time.sleep(node.latency)
+                if isinstance(body, list):
+                    response = [node.handle(request) for request in body]
+                else:
+                    response = node.handle(body)
+                with node.counter_lock:
+                    node.requests += 1
+                    node.calls += len(body) if isinstance(body, list) else 1
+                data = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-node', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def handle(self, request):
+        method, params = request.get('method'), request.get('params', [])
+        try:
+            result = self.dispatch(method, params)
+        except RPCError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': e.code, 'message': e.message}}
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+    def dispatch(self, method, params):
+        chain = self.chain
+        if method == 'eth_blockNumber':
+            return hex(chain.head())
+        if method == 'eth_chainId':
+            return '0x1'
+        if method == 'eth_getBlockByNumber':
+            return chain.block_by_number(params[0], params[1] if len(params) > 1 else False)
+        if method == 'eth_getBlockByHash':
+            return chain.block_by_hash(params[0], params[1] if len(params) > 1 else False)
+        if method == 'eth_getLogs':
+            return chain.get_logs(params[0])
+        if method == 'eth_getTransactionByHash':
+            with chain.lock:
+                return chain.transactions.get(params[0].lower())
+        if method == 'eth_getTransactionReceipt':
+            with chain.lock:
+                return chain.receipts.get(params[0].lower())
+        raise RPCError(-32601, f"Method {method} not supported")
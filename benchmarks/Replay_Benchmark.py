@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import importlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Fake_Chain_Node import FakeChain, FakeNode
+from SQLite_Database import SQLiteDatabase
+from RPC_Batch import format_result
+from RPC_Pool import ProviderPool
+from Notification_Dispatcher import NotificationDispatcher
+from Deposit_Sinks import JSONLSink
+from Deposit_Rollups import buckets_of
+
+# Drives the DepositTracker engine with different sink sets against a fake JSON-RPC node and a
+# SQLite stand-in for MySQL, and prints one JSON document of results for regression comparison:
+#   python benchmarks/Replay_Benchmark.py --output results.json
+# Heads are handed to tick() as a newHeads subscription would, so polling costs are excluded.
+
+# Sinks attached to the engine besides MySQL in each configuration
+CONFIGS = {'eth': (), 'telegram': ('telegram',), 'fanout': ('telegram', 'jsonl')}
+SCENARIOS = ('steady_state', 'catch_up', 'reorg_storm', 'notification_burst')
+WARMUP_BLOCKS = 128
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def probe_sink_class():
+    # Telegram_Notification needs python-telegram-bot, so it is only imported for runs that notify
+    from Telegram_Notification import (TelegramSink, NOTIFY_QUEUE_SIZE, NOTIFY_CONCURRENCY, NOTIFY_GLOBAL_RATE,
+                                       NOTIFY_PER_CHAT_RATE)
+
+    class ProbeSink(TelegramSink):
+        # The real Telegram sink and NotificationDispatcher without a bot: sends are faked and record
+        # the time from a block being mined to each notification for it being sent
+        def __init__(self, chain, subscribers, send_latency):
+            super().__init__(db_config=None, token=None)
+            self.chain = chain
+            self.subscribers = list(range(1, subscribers + 1))
+            self.send_latency = send_latency
+            self.latencies = []
+
+        async def setup(self):
+            self.dispatcher = NotificationDispatcher(
+                self.send_message, self.load_subscribers, self.format_message,
+                max_queue=NOTIFY_QUEUE_SIZE, concurrency=NOTIFY_CONCURRENCY,
+                global_rate=NOTIFY_GLOBAL_RATE, per_chat_rate=NOTIFY_PER_CHAT_RATE
+            )
+            self.dispatcher.start()
+
+        async def load_subscribers(self):
+            return self.subscribers
+
+        def format_message(self, block_number, deposits):
+            return block_number, self.format_notification(block_number, deposits)
+
+        async def send_message(self, chat_id, message):
+            block_number, _ = message
+            await asyncio.sleep(self.send_latency)
+            self.latencies.append(time.monotonic() - self.chain.produced_at[block_number])
+
+        def drain(self, timeout):
+            # Waits for everything submitted so far; submissions are queued with call_soon_threadsafe,
+            # so a coroutine scheduled afterwards sees them
+            try:
+                asyncio.run_coroutine_threadsafe(self.dispatcher.queue.join(), self.loop).result(timeout)
+                return True
+            except Exception:
+                return False
+
+    return ProbeSink
+
+
+class Run:
+    # One scenario against one sink configuration: a fresh chain, node, database and tracker
+    def __init__(self, config, args, chain_options=None):
+        self.config = config
+        self.module = importlib.import_module('ETH_Deposit_Tracker')
+        self.args = args
+        self.chain = FakeChain(seed=args.seed, **(chain_options or {}))
+        self.chain.mine(WARMUP_BLOCKS)
+        self.node = FakeNode(self.chain, latency=args.latency).start()
+        self.db_file = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False)
+        self.db = SQLiteDatabase(self.db_file.name)
+        self.uninstall = self.db.install(self.module.mysql.connector)
+
+        module = self.module
+        # Tracker module settings replaced for this run and put back by close()
+        self.saved = {name: getattr(module, name) for name in ('INGESTION_MODE', 'rpc')}
+        module.INGESTION_MODE = args.mode
+        module.rpc = ProviderPool([self.node.url], max_batch_size=module.RPC_BATCH_SIZE,
+                                  timeout=module.RPC_TIMEOUT, hedge_after=module.RPC_HEDGE_AFTER,
+                                  cache_size=module.RPC_CACHE_SIZE)
+        self.probe = None
+        self.jsonl_file = None
+        sinks = []
+        if 'telegram' in CONFIGS[config]:
+            self.probe = probe_sink_class()(self.chain, args.subscribers, args.send_latency)
+            sinks.append(self.probe)
+        if 'jsonl' in CONFIGS[config]:
+            self.jsonl_file = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False)
+            sinks.append(JSONLSink(self.jsonl_file.name, buffer_size=module.SINK_BUFFER_SIZE,
+                                   policy=module.JSONL_BACKPRESSURE, block_timeout=module.SINK_BLOCK_TIMEOUT))
+        self.sinks = sinks
+        for sink in sinks:
+            sink.start()
+        self.tracker = module.DepositTracker(sinks)
+        self.tracker.last_processed_block = self.first_block = self.chain.head()
+
+    def head(self):
+        return format_result(self.chain.block_by_number('latest'))
+
+    def tick_until_caught_up(self):
+        while self.tracker.tick(self.head()):
+            pass
+
+    def measure(self, scenario, work, drain=False):
+        # Only drained scenarios wait for the notification queue; elsewhere the per-chat rate
+        # limit would dominate the run, so latencies cover the notifications sent so far
+        rpc = self.module.rpc
+        start_block = self.tracker.last_processed_block
+        calls, round_trips, db_round_trips = rpc.calls, rpc.round_trips, self.db.counters.round_trips
+        started = time.monotonic()
+        work()
+        elapsed = time.monotonic() - started
+        drained = self.probe.drain(self.args.drain_timeout) if self.probe and drain else None
+        blocks = max(self.tracker.last_processed_block - start_block, 1)
+
+        result = {
+            'scenario': scenario,
+            'config': self.config,
+            'mode': self.args.mode,
+            'blocks': self.tracker.last_processed_block - start_block,
+            'reorgs': self.chain.reorgs,
+            'elapsed_seconds': round(elapsed, 4),
+            'blocks_per_second': round(blocks / elapsed, 2) if elapsed else None,
+            'rpc_calls_per_block': round((rpc.calls - calls) / blocks, 3),
+            'rpc_round_trips_per_block': round((rpc.round_trips - round_trips) / blocks, 3),
+            'db_round_trips_per_block': round((self.db.counters.round_trips - db_round_trips) / blocks, 3),
+            'rpc_cache_hit_rate': round(rpc.stats().get('cache_hit_rate', 0.0), 4),
+            'consistent': self.consistent(),
+            'rollups_consistent': self.rollups_consistent(),
+        }
+        for sink in self.sinks:
+            result[f"{sink.name}_sink"] = sink.stats()
+        if self.probe:
+            stats = self.probe.dispatcher.stats()
+            result.update({
+                'notifications_sent': stats['sent'],
+                'notifications_dropped': stats['dropped'],
+                'notifications_drained': drained,
+                'notify_latency_p50': percentile(self.probe.latencies, 0.5),
+                'notify_latency_p95': percentile(self.probe.latencies, 0.95),
+                'notify_latency_max': max(self.probe.latencies) if self.probe.latencies else None,
+            })
+        return result
+
+    def consistent(self):
+        # Valid rows must be exactly the canonical deposits between the starting point and the watermark
+        last_block = self.tracker.last_processed_block
+        stored = self.db.query(
+            "SELECT hash, logIndex FROM Deposits WHERE status = 'valid' AND blockNumber <= ?", (last_block,)
+        )
+        return len(stored) == len(set(stored)) and set(stored) == self.chain.canonical_deposits(self.first_block + 1, last_block)
+
+    def rollups_consistent(self):
+        # Incrementally maintained rollups must equal a full recompute over the valid deposits
+        expected = {}
+        for block_number, block_timestamp, fee, pubkey, amount_gwei in self.db.query(
+                "SELECT blockNumber, blockTimestamp, fee, pubkey, amount_gwei FROM Deposits WHERE status = 'valid'"):
+            for key in buckets_of(block_number, block_timestamp):
+                row = expected.setdefault(key, [0, 0, 0, set()])
+                row[0] += 1
+                row[1] += int(amount_gwei or 0)
+                row[2] += int(fee or 0)
+                if pubkey:
+                    row[3].add(pubkey)
+        stored = {
+            (granularity, bucket): (deposits, int(amount_gwei), int(fee_wei), distinct_pubkeys)
+            for granularity, bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys in self.db.query(
+                'SELECT granularity, bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys FROM Deposit_Rollups')
+        }
+        return stored == {key: (count, amount, fee, len(pubkeys)) for key, (count, amount, fee, pubkeys) in expected.items()}
+
+    def close(self):
+        for sink in self.sinks:
+            sink.stop()
+        self.node.stop()
+        self.uninstall()
+        for name, value in self.saved.items():
+            setattr(self.module, name, value)
+        os.unlink(self.db_file.name)
+        if self.jsonl_file:
+            os.unlink(self.jsonl_file.name)
+
+
+def steady_state(config, args):
+    run = Run(config, args)
+
+    def work():
+        for _ in range(args.blocks):
+            run.chain.mine()
+            run.tick_until_caught_up()
+
+    return run, run.measure('steady_state', work)
+
+
+def catch_up(config, args):
+    run = Run(config, args)
+    run.chain.mine(args.catch_up_blocks)
+    return run, run.measure('catch_up', run.tick_until_caught_up)
+
+
+def reorg_storm(config, args):
+    run = Run(config, args)
+    rng = random.Random(args.seed)
+
+    def work():
+        for i in range(args.blocks):
+            if i % args.reorg_every == args.reorg_every - 1:
+                run.chain.reorg(rng.randint(1, args.max_reorg_depth))
+            else:
+                run.chain.mine()
+            run.tick_until_caught_up()
+
+    return run, run.measure('reorg_storm', work)
+
+
+def notification_burst(config, args):
+    if 'telegram' not in CONFIGS[config]:
+        return None, None
+    run = Run(config, args)
+
+    def work():
+        for _ in range(args.burst_blocks):
+            run.chain.mine(deposits=args.burst_deposits)
+        run.tick_until_caught_up()
+
+    return run, run.measure('notification_burst', work, drain=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay benchmark for DepositTracker against a fake node')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS),
+                        help='sink sets attached to the engine: none, telegram, or telegram and jsonl')
+    parser.add_argument('--mode', choices=('logs', 'blocks'), default='logs')
+    parser.add_argument('--blocks', type=int, default=200, help='blocks followed in steady_state and reorg_storm')
+    parser.add_argument('--catch-up-blocks', type=int, default=10000)
+    parser.add_argument('--reorg-every', type=int, default=5)
+    parser.add_argument('--max-reorg-depth', type=int, default=6)
+    parser.add_argument('--burst-blocks', type=int, default=10)
+    parser.add_argument('--burst-deposits', type=int, default=40, help='deposits per block in notification_burst')
+    parser.add_argument('--subscribers', type=int, default=20)
+    parser.add_argument('--send-latency', type=float, default=0.02, help='seconds per fake Telegram send')
+    parser.add_argument('--drain-timeout', type=float, default=120)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of fake node latency per HTTP request')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    # The tracker modules read their configuration at import
+    os.environ.setdefault('ETH_RPC_URL', 'http://127.0.0.1:8545')
+    os.environ.setdefault('RPC_HEDGE_AFTER', '0')
+    import ETH_Deposit_Tracker  # noqa: F401  (configures logging)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+
+    results = []
+    for scenario in args.scenarios:
+        for config in args.configs:
+            run, result = globals()[scenario](config, args)
+            if run is None:
+                continue
+            run.close()
+            results.append(result)
+            print(f"{scenario} {config}: {result['blocks_per_second']} blocks/sec", file=sys.stderr)
+
+    document = json.dumps({
+        'benchmark': 'replay',
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+        'results': results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+    else:
+        print(document)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import re
+import sqlite3
+import threading
+
+# MySQL stand-in for benchmarks: translates the MySQL dialect the trackers use into SQLite
+# and counts statements and commits, each of which would be a network round trip to MySQL.
+# executemany counts once, since mysql-connector sends batched INSERTs as one statement.
+
+SHOW_COLUMNS = re.compile(r"^\s*SHOW COLUMNS FROM (\w+) LIKE '(\w+)'\s*$", re.I)
+SHOW_INDEX = re.compile(r"^\s*SHOW INDEX FROM (\w+) WHERE Key_name = '(\w+)'\s*$", re.I)
+CREATE_TABLE = re.compile(r"^\s*CREATE TABLE IF NOT EXISTS (\w+) \((.*)\)\s*$", re.I | re.S)
+ALTER_ADD_COLUMNS = re.compile(r"^\s*ALTER TABLE (\w+)\s+(ADD COLUMN .*)$", re.I | re.S)
+ALTER_ADD_UNIQUE = re.compile(r"^\s*ALTER TABLE (\w+) ADD UNIQUE KEY (\w+) \(([^)]*)\)\s*$", re.I)
+AFTER_COLUMN = re.compile(r' AFTER \w+', re.I)
+INDEX_LINE = re.compile(r"^(UNIQUE )?(?:KEY|INDEX)\s*(\w+)?\s*\(([^)]*)\),?$", re.I)
+
+
+def translate_create(table, body):
+    columns = []
+    statements = []
+    for line in (line.strip() for line in body.strip().splitlines()):
+        if not line:
+            continue
+        index = INDEX_LINE.match(line)
+        if index:
+            unique, name, cols = index.groups()
+            name = name or f"{table}_{'_'.join(col.strip() for col in cols.split(','))}"
+            statements.append(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+            continue
+        line = re.sub(r'INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT', line, flags=re.I)
+        line = re.sub(r"ENUM\([^)]*\)", 'TEXT', line, flags=re.I)
+        line = re.sub(r'ON UPDATE CURRENT_TIMESTAMP', '', line, flags=re.I)
+        line = re.sub(r'\bUNSIGNED\b', '', line, flags=re.I)
+        columns.append(line.rstrip(','))
+    return [f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})"] + statements
+
+
+def translate(query):
+    # Returns the SQLite statements for one MySQL statement
+    match = SHOW_COLUMNS.match(query)
+    if match:
+        return [f"SELECT name FROM pragma_table_info('{match.group(1)}') WHERE name = '{match.group(2)}'"]
+    match = SHOW_INDEX.match(query)
+    if match:
+        return [f"SELECT name FROM pragma_index_list('{match.group(1)}') WHERE name = '{match.group(2)}'"]
+    match = CREATE_TABLE.match(query)
+    if match:
+        return translate_create(*match.groups())
+    match = ALTER_ADD_UNIQUE.match(query)
+    if match:
+        return [f"CREATE UNIQUE INDEX {match.group(2)} ON {match.group(1)} ({match.group(3)})"]
+    match = ALTER_ADD_COLUMNS.match(query)
+    if match:
+        table, additions = match.groups()
+        additions = re.split(r',\s*(?=ADD COLUMN)', additions, flags=re.I)
+        return [f"ALTER TABLE {table} {AFTER_COLUMN.sub('', addition.strip())}" for addition in additions]
+
+    query = query.replace('%s', '?')
+    query = re.sub(r'ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET', query, flags=re.I)
+    query = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', query)
+    query = re.sub(r'(INSERT|UPDATE) IGNORE', r'\1 OR IGNORE', query, flags=re.I)
+    query = re.sub(r"CONCAT\(('[^']*'), (\w+)\)", r'(\1 || \2)', query, flags=re.I)
+    # SQLite only takes a subquery on the right of a row-value IN
+    query = re.sub(r'\) IN \(\(', ') IN (VALUES (', query)
+    query = re.sub(r'\bFOR UPDATE\b', '', query, flags=re.I)
+    query = re.sub(r'NOW\(\) \+ INTERVAL \? SECOND', "datetime('now', '+' || ? || ' seconds')", query, flags=re.I)
+    query = re.sub(r'NOW\(\)', "datetime('now')", query, flags=re.I)
+    query = re.sub(r'GREATEST\(', 'MAX(', query, flags=re.I)
+    query = re.sub(r'\bIF\(', 'IIF(', query)
+    return [query]
+
+
+class Counters:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        self.lock = threading.Lock()
+
+    @property
+    def round_trips(self):
+        return self.statements + self.commits
+
+    def count(self, statements=0, commits=0):
+        with self.lock:
+            self.statements += statements
+            self.commits += commits
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.sqlite.cursor()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def with_rows(self):
+        return self.cursor.description is not None
+
+    def execute(self, query, params=()):
+        self.connection.counters.count(statements=1)
+        for statement in translate(query):
+            self.cursor.execute(statement, tuple(params))
+
+    def executemany(self, query, seq_of_params):
+        self.connection.counters.count(statements=1)
+        for statement in translate(query):
+            self.cursor.executemany(statement, [tuple(params) for params in seq_of_params])
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+class Connection:
+    def __init__(self, path, counters):
+        self.sqlite = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.sqlite.execute('PRAGMA journal_mode = WAL')
+        self.sqlite.execute('PRAGMA synchronous = OFF')
+        self.counters = counters
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.counters.count(commits=1)
+        self.sqlite.commit()
+
+    def rollback(self):
+        self.counters.count(commits=1)
+        self.sqlite.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.sqlite.close()
+
+
+class SQLiteDatabase:
+    # Hands out connections to one SQLite file; install() replaces mysql.connector.connect until
+    # the function it returns is called
+    def __init__(self, path):
+        self.path = path
+        self.counters = Counters()
+
+    def connect(self, **kwargs):
+        return Connection(self.path, self.counters)
+
+    def install(self, connector):
+        original = connector.connect
+        connector.connect = self.connect
+
+        def uninstall():
+            connector.connect = original
+        return uninstall
+
+    def query(self, query, params=()):
+        with sqlite3.connect(self.path) as db:
+            return db.execute(query, params).fetchall()
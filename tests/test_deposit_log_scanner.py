@@ -0,0 +1,81 @@
+import os
+import sys
+import types
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+requests = pytest.importorskip('requests')
+
+from Deposit_Log_Scanner import DepositLogScanner, is_range_too_large
+
+
+class FailingRPC:
+    # Raises the queued errors in turn, then answers with no logs
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.ranges = []
+
+    def get_logs(self, params):
+        self.ranges.append((int(params['fromBlock'], 16), int(params['toBlock'], 16)))
+        if self.errors:
+            raise self.errors.pop(0)
+        return []
+
+
+def scanner(rpc, initial_range=100):
+    w3 = types.SimpleNamespace(to_checksum_address=lambda address: address)
+    return DepositLogScanner(w3, '0x00000000219ab540356cBB839Cbe05303d7705Fa', initial_range=initial_range, rpc=rpc)
+
+
+def http_error(status, reason):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.url = 'http://node'
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        return e
+
+
+@pytest.mark.parametrize('error', [
+    ValueError({'code': -32005, 'message': 'query returned more than 10000 results'}),
+    ValueError({'code': -32602, 'message': 'Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range'}),
+    ValueError({'code': -32000, 'message': 'block range is too large'}),
+])
+def test_range_errors_are_recognized(error):
+    assert is_range_too_large(error)
+
+
+@pytest.mark.parametrize('error', [
+    http_error(429, 'Too Many Requests'),
+    requests.exceptions.ReadTimeout('Read timed out. (read timeout=15)'),
+    requests.exceptions.ConnectionError('Connection aborted'),
+    ValueError({'code': -32005, 'message': 'daily request count exceeded, request rate limited'}),
+    ValueError({'code': 429, 'message': 'Too many requests, reason: call rate limit exhausted'}),
+])
+def test_transport_and_rate_limit_errors_are_not_range_errors(error):
+    assert not is_range_too_large(error)
+
+
+def test_rejected_range_is_halved_and_retried():
+    rpc = FailingRPC([ValueError({'code': -32005, 'message': 'query returned more than 10000 results'})])
+    scan = scanner(rpc)
+    chunks = [(start, end) for start, end, _ in scan.scan(1000, 1099)]
+    assert rpc.ranges[:2] == [(1000, 1099), (1000, 1049)]
+    assert chunks[0] == (1000, 1049)
+    assert chunks[-1][1] == 1099
+
+
+@pytest.mark.parametrize('error', [
+    http_error(429, 'Too Many Requests'),
+    requests.exceptions.ReadTimeout('Read timed out.'),
+])
+def test_rate_limits_and_timeouts_leave_the_range_alone(error):
+    rpc = FailingRPC([error])
+    scan = scanner(rpc)
+    with pytest.raises(type(error)):
+        list(scan.scan(1000, 1099))
+    assert scan.range_size == 100
+    assert scan.range_ceiling == scan.max_range
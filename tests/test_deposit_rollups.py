@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+# create_tables lives in the tracker module, which needs web3 to import
+pytest.importorskip('web3')
+
+import Deposit_Rollups
+from Deposit_Rollups import apply_deposits, invalidate_deposits, load_pubkey_counts, newly_valid, rebuild_rollups
+from ETH_Deposit_Tracker import create_tables
+from SQLite_Database import SQLiteDatabase
+from Write_Batcher import INSERT_DEPOSIT
+
+HOUR_START = 1700002800
+
+
+def deposit(tx, block_number, pubkey, amount_gwei=32 * 10**9):
+    return {'blockNumber': block_number, 'blockTimestamp': HOUR_START + (block_number - 100) * 12, 'fee': '1000',
+            'hash': '0x%064x' % tx, 'logIndex': 0, 'pubkey': pubkey, 'withdrawal_credentials': '0x' + '11' * 32,
+            'amount_gwei': amount_gwei, 'signature': '0x' + '22' * 96, 'deposit_index': tx}
+
+
+@pytest.fixture
+def db():
+    path = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False).name
+    connection = SQLiteDatabase(path).connect()
+    create_tables(connection.cursor())
+    connection.commit()
+    yield connection
+    connection.close()
+    os.unlink(path)
+
+
+def save(db, deposits):
+    cursor = db.cursor()
+    fresh = newly_valid(cursor, deposits)
+    cursor.executemany(INSERT_DEPOSIT, [
+        (d['blockNumber'], d['blockTimestamp'], d['fee'], d['hash'], d['logIndex'], d['pubkey'],
+         d['withdrawal_credentials'], d['amount_gwei'], d['signature'], d['deposit_index'])
+        for d in deposits
+    ])
+    apply_deposits(cursor, fresh)
+    db.commit()
+
+
+def invalidate(db, tx):
+    invalidate_deposits(db.cursor(), 'hash = %s', ('0x%064x' % tx,))
+    db.commit()
+
+
+def rollups(db):
+    cursor = db.cursor()
+    cursor.execute('SELECT granularity, bucket, deposits, amount_gwei, fee_wei, distinct_pubkeys FROM Deposit_Rollups')
+    rows = {(granularity, bucket): tuple(int(value) for value in values)
+            for granularity, bucket, *values in cursor.fetchall()}
+    cursor.execute('SELECT granularity, bucket, pubkey, deposits FROM Deposit_Rollup_Pubkeys')
+    return rows, set(cursor.fetchall())
+
+
+def recomputed(db):
+    # What a full rebuild from the valid deposits gives, without keeping it
+    rebuild_rollups(db.cursor())
+    result = rollups(db)
+    db.rollback()
+    return result
+
+
+def distinct_pubkeys(db, granularity, bucket):
+    rows, _ = rollups(db)
+    return rows.get((granularity, bucket), (0, 0, 0, 0))[3]
+
+
+def test_distinct_pubkeys_stay_exact_under_invalidation(db):
+    # Two deposits for pubkey a in block 100, then b and a again in block 101, all in one hour
+    save(db, [deposit(1, 100, 'a'), deposit(2, 100, 'a'), deposit(3, 101, 'b'), deposit(4, 101, 'a')])
+    assert distinct_pubkeys(db, 'block', 100) == 1
+    assert distinct_pubkeys(db, 'hour', HOUR_START) == 2
+    assert rollups(db) == recomputed(db)
+
+    # Re-ingesting a stored deposit changes nothing
+    save(db, [deposit(2, 100, 'a')])
+    assert rollups(db) == recomputed(db)
+
+    # a still has a deposit in block 100, so it keeps counting there
+    invalidate(db, 1)
+    assert distinct_pubkeys(db, 'block', 100) == 1
+    assert rollups(db) == recomputed(db)
+
+    # The block is emptied and its rows removed, while a still counts in block 101 and the hour
+    invalidate(db, 2)
+    assert ('block', 100) not in rollups(db)[0]
+    assert distinct_pubkeys(db, 'hour', HOUR_START) == 2
+    assert rollups(db) == recomputed(db)
+
+    invalidate(db, 4)
+    assert distinct_pubkeys(db, 'hour', HOUR_START) == 1
+    assert distinct_pubkeys(db, 'total', 0) == 1
+    assert rollups(db) == recomputed(db)
+
+    # A deposit coming back after a reorg is counted again
+    save(db, [deposit(4, 101, 'a')])
+    assert distinct_pubkeys(db, 'hour', HOUR_START) == 2
+    assert rollups(db) == recomputed(db)
+
+
+def test_pubkey_counts_are_read_by_full_key(db, monkeypatch):
+    monkeypatch.setattr(Deposit_Rollups, 'PUBKEY_LOOKUP_ROWS', 2)
+    save(db, [deposit(1, 100, 'a'), deposit(2, 100, 'a'), deposit(3, 101, 'b')])
+    # Same bucket and pubkeys as stored rows in other combinations, which must not be returned
+    keys = [('block', 100, 'a'), ('block', 100, 'b'), ('block', 101, 'a'), ('block', 101, 'b'), ('total', 0, 'a')]
+    assert load_pubkey_counts(db.cursor(), keys) == {('block', 100, 'a'): 2, ('block', 101, 'b'): 1, ('total', 0, 'a'): 2}
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Deposit_Sinks import BufferedSink, reorg_event
+
+
+class StuckSink(BufferedSink):
+    # Never finishes delivering, like a sink writing to a hung disk or endpoint
+    name = 'stuck'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+
+    def deliver(self, events):
+        self.release.wait()
+
+
+@pytest.mark.parametrize('policy', ['block', 'drop_newest', 'drop_oldest'])
+def test_stuck_sink_does_not_stall_publisher(policy):
+    sink = StuckSink(buffer_size=2, policy=policy, block_timeout=0.05)
+    sink.start()
+    try:
+        started = time.monotonic()
+        for i in range(100):
+            sink.publish(reorg_event(i, 1, 0))
+        assert time.monotonic() - started < 0.5
+        stats = sink.stats()
+        assert stats['published'] == 100
+        assert stats['dropped'] >= 100 - 2 - sink.max_batch
+    finally:
+        sink.release.set()
+        sink.stop(timeout=1)
+
+
+def test_block_policy_waits_again_once_the_buffer_drains():
+    sink = StuckSink(buffer_size=1, policy='block', block_timeout=0.05)
+    sink.start()
+    try:
+        for i in range(5):
+            sink.publish(reorg_event(i, 1, 0))
+        assert sink.stalled
+        sink.release.set()
+        deadline = time.monotonic() + 1
+        while not sink.buffer.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sink.publish(reorg_event(5, 1, 0))
+        assert not sink.stalled
+    finally:
+        sink.release.set()
+        sink.stop(timeout=1)
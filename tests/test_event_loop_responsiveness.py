@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+# The Telegram sink needs python-telegram-bot even though no bot is started here
+pytest.importorskip('telegram')
+
+from Replay_Benchmark import Run
+from Telegram_Notification import TelegramSink
+
+# Every JSON-RPC answer from the stand-in node, and every stand-in database call, takes this long
+SLOW_CALL_SECONDS = 0.3
+# How late the Telegram sink's event loop may wake a 10 ms sleeper while that I/O is in flight
+MAX_LOOP_LAG = 0.1
+
+
+async def measure_lag(done, interval=0.01):
+    # Worst delay past the requested sleep until done() returns True
+    worst = 0.0
+    while not done():
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.monotonic() - started - interval)
+    return worst
+
+
+def test_slow_node_does_not_stall_telegram_loop():
+    # The engine ticks on this thread against a delayed fake node while the Telegram sink's
+    # dispatcher, with faked sends, keeps its own loop responsive
+    args = argparse.Namespace(seed=1, latency=SLOW_CALL_SECONDS, mode='logs', subscribers=3, send_latency=0.0)
+    run = Run('telegram', args)
+    try:
+        ticked = threading.Event()
+        lag = asyncio.run_coroutine_threadsafe(measure_lag(ticked.is_set), run.probe.loop)
+        run.chain.mine(8)
+        started = time.monotonic()
+        run.tick_until_caught_up()
+        elapsed = time.monotonic() - started
+        ticked.set()
+        worst_lag = lag.result(5)
+
+        assert elapsed >= SLOW_CALL_SECONDS
+        assert run.tracker.last_processed_block == run.chain.head()
+        assert worst_lag < MAX_LOOP_LAG
+        assert run.probe.drain(5)
+        assert run.probe.dispatcher.stats()['sent'] > 0
+    finally:
+        run.close()
+
+
+def test_slow_database_does_not_stall_telegram_loop():
+    # Bot handlers query MySQL through run_db, which must leave the loop free while the query runs
+    sink = TelegramSink(db_config=None, token=None)
+    sink.execute_db = lambda query, params=(), many=False: time.sleep(SLOW_CALL_SECONDS)
+    sink.thread.start()
+    try:
+        async def query_while_measuring():
+            query = asyncio.ensure_future(asyncio.gather(*(sink.run_db('SELECT 1') for _ in range(3))))
+            lag = await measure_lag(query.done)
+            await query
+            return lag
+
+        started = time.monotonic()
+        lag = asyncio.run_coroutine_threadsafe(query_while_measuring(), sink.loop).result(5)
+        assert time.monotonic() - started >= SLOW_CALL_SECONDS
+        assert lag < MAX_LOOP_LAG
+    finally:
+        sink.stop()
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import socket
+import threading
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+pytest.importorskip('websockets')
+
+from Fake_Chain_Node import FakeChain, FakeNode
+from Head_Tracker import HeadTracker
+from RPC_Pool import ProviderPool
+
+
+class RecordingEvent(threading.Event):
+    # The tracker sleeps on its stop event, so this records every delay between polls
+    def __init__(self):
+        super().__init__()
+        self.delays = []
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        return super().wait(timeout)
+
+
+@pytest.fixture
+def chain():
+    chain = FakeChain(seed=1)
+    chain.mine(4)
+    return chain
+
+
+@pytest.fixture
+def node(chain):
+    node = FakeNode(chain).start()
+    yield node
+    node.stop()
+
+
+def head_tracker(node, **options):
+    options = {'min_interval': 0.01, 'max_interval': 0.05, 'max_backoff': 0.08, **options}
+    return HeadTracker(ProviderPool([node.url], timeout=2, hedge_after=0), **options)
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_polling_publishes_new_heads_and_wakes_waiters(chain, node):
+    tracker = head_tracker(node)
+    tracker.start()
+    try:
+        head, version = tracker.wait(0, timeout=5)
+        assert head['number'] == chain.head()
+
+        woken = []
+        waiter = threading.Thread(target=lambda: woken.append(tracker.wait(version, timeout=5)))
+        waiter.start()
+        chain.mine()
+        waiter.join(5)
+        assert woken and woken[0][0]['number'] == chain.head()
+        assert woken[0][1] == version + 1
+        assert tracker.stats()['mode'] == 'polling'
+    finally:
+        tracker.stop()
+
+
+def test_polling_backs_off_while_the_node_fails(chain, node):
+    node.error_status = 503
+    tracker = head_tracker(node)
+    tracker.stopped = RecordingEvent()
+    tracker.start()
+    try:
+        for _ in range(200):
+            if len(tracker.stopped.delays) >= 5:
+                break
+            time.sleep(0.01)
+        assert tracker.stopped.delays[:5] == [0.02, 0.04, 0.08, 0.08, 0.08]
+        assert tracker.head is None
+
+        # The first successful poll publishes the head and resets the backoff
+        node.error_status = None
+        head, _ = tracker.wait(0, timeout=5)
+        assert head['number'] == chain.head()
+        assert tracker.failures == 0
+    finally:
+        tracker.stop()
+
+
+def test_failing_subscription_falls_back_to_polling(chain, node):
+    tracker = head_tracker(node, ws_url=f"ws://127.0.0.1:{unused_port()}")
+    tracker.start()
+    try:
+        head, version = tracker.wait(0, timeout=5)
+        assert head['number'] == chain.head()
+        chain.mine()
+        head, _ = tracker.wait(version, timeout=5)
+        assert head['number'] == chain.head()
+        assert tracker.failures >= 1
+        assert tracker.polls > 0
+    finally:
+        tracker.stop()
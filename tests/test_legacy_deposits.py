@@ -0,0 +1,54 @@
+import os
+import sys
+import argparse
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+pytest.importorskip('web3')
+
+from Replay_Benchmark import Run
+from Deposit_Rollups import rebuild_rollups
+
+
+def make_legacy(run, start_block, end_block):
+    # Rewrites stored deposits the way the tracker wrote them before logIndex and DepositData:
+    # hashes without the 0x prefix, logIndex 0 and no decoded columns
+    db = run.db.connect()
+    cursor = db.cursor()
+    cursor.execute('''
+        UPDATE Deposits SET hash = substr(hash, 3), logIndex = 0, pubkey = NULL, withdrawal_credentials = NULL,
+                            amount_gwei = NULL, signature = NULL, deposit_index = NULL
+        WHERE blockNumber BETWEEN %s AND %s AND logIndex = 0
+    ''', (start_block, end_block))
+    cursor.execute('DELETE FROM Deposits WHERE blockNumber BETWEEN %s AND %s AND logIndex > 0', (start_block, end_block))
+    rebuild_rollups(cursor)
+    db.commit()
+    db.close()
+
+
+@pytest.mark.parametrize('mode,batched', [('logs', True), ('logs', False), ('blocks', True)])
+def test_reingested_legacy_deposits_replace_their_rows(mode, batched, monkeypatch):
+    args = argparse.Namespace(seed=3, latency=0.0, mode=mode, subscribers=0, send_latency=0.0)
+    run = Run('eth', args, chain_options={'deposits_every': 1, 'deposits_per_block': 2})
+    try:
+        monkeypatch.setattr(run.module, 'BATCHED_WRITES', batched)
+        run.chain.mine(12)
+        run.tick_until_caught_up()
+        first, last = run.first_block + 1, run.chain.head()
+        make_legacy(run, first, first + 5)
+        assert not run.consistent()
+
+        # A restart migrates the hashes and reloads the seen set, then the legacy blocks are ingested again
+        tracker = run.module.DepositTracker([])
+        tracker.last_processed_block = run.tracker.last_processed_block
+        run.tracker = tracker
+        assert tracker.ingest_blocks(first, last) == last
+
+        assert run.consistent()
+        assert run.rollups_consistent()
+        assert run.db.query('SELECT COUNT(*) FROM Deposits WHERE pubkey IS NULL') == [(0,)]
+        assert run.db.query('SELECT COUNT(*) FROM Deposits') == [(len(run.chain.canonical_deposits(first, last)),)]
+    finally:
+        run.close()
@@ -0,0 +1,98 @@
+import os
+import sys
+import argparse
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+pytest.importorskip('web3')
+
+from Replay_Benchmark import Run
+from RPC_Batch import to_hex
+
+# Blocks ingested before the reorg, enough for the deepest case to exceed REORG_DEPTH
+CHAIN_BLOCKS = 100
+
+
+@pytest.fixture(params=['logs', 'blocks'])
+def run(request):
+    args = argparse.Namespace(seed=5, latency=0.0, mode=request.param, subscribers=0, send_latency=0.0)
+    run = Run('eth', args, chain_options={'deposits_every': 1})
+    run.chain.mine(CHAIN_BLOCKS)
+    run.tick_until_caught_up()
+    assert run.consistent()
+    yield run
+    run.close()
+
+
+def deposits(run, status):
+    return {tuple(row) for row in run.db.query(
+        'SELECT hash, logIndex, blockNumber FROM Deposits WHERE status = ?', (status,))}
+
+
+def reorg_and_roll_back(run, depth, extra):
+    # Returns the orphaned (hash, logIndex, blockNumber) deposits, after handling the new head
+    before = deposits(run, 'valid')
+    run.chain.reorg(depth, extra)
+    canonical = run.chain.canonical_deposits(run.first_block + 1, run.chain.head())
+    run.tracker.handle_reorg(run.head())
+    return {deposit for deposit in before if deposit[:2] not in canonical}
+
+
+def assert_rolled_back_to(run, ancestor):
+    tracker = run.tracker
+    assert tracker.last_processed_block == ancestor
+    assert tracker.processed_ranges.last_block() == ancestor
+    assert run.db.query('SELECT MAX(end_block) FROM Processed_Ranges') == [(ancestor,)]
+    assert tracker.block_hashes.latest() == ancestor
+    assert tracker.block_hashes.get_hash(ancestor) == to_hex(run.chain.block_by_number(ancestor)['hash'])
+    assert run.db.query('SELECT MAX(block_number) FROM Processed_Blocks') == [(ancestor,)]
+    valid = {deposit[:2] for deposit in deposits(run, 'valid') if deposit[2] > run.first_block}
+    assert valid == run.chain.canonical_deposits(run.first_block + 1, ancestor)
+
+
+def test_reorg_invalidates_only_orphaned_deposits(run):
+    last = run.tracker.last_processed_block
+    orphaned = reorg_and_roll_back(run, depth=3, extra=1)
+    assert {deposit[2] for deposit in orphaned} == {last - 2, last - 1, last}
+    assert deposits(run, 'invalid') == orphaned
+    assert_rolled_back_to(run, last - 3)
+
+    run.tick_until_caught_up()
+    assert run.tracker.last_processed_block == run.chain.head()
+    assert run.consistent()
+    assert run.rollups_consistent()
+
+
+def test_head_moving_backwards_is_rolled_back(run):
+    last = run.tracker.last_processed_block
+    orphaned = reorg_and_roll_back(run, depth=5, extra=-2)
+    assert run.chain.head() == last - 2
+    assert deposits(run, 'invalid') == orphaned
+    assert_rolled_back_to(run, last - 5)
+
+    run.tick_until_caught_up()
+    assert run.tracker.last_processed_block == last - 2
+    assert run.consistent()
+    assert run.rollups_consistent()
+
+
+def test_reorg_deeper_than_reorg_depth_rolls_back_reorg_depth_blocks(run):
+    # No remembered hash is canonical any more, so the tracker gives up at REORG_DEPTH blocks and
+    # orphaned deposits below that are left as they are
+    depth = run.module.REORG_DEPTH
+    last = run.tracker.last_processed_block
+    orphaned = reorg_and_roll_back(run, depth=depth + 10, extra=1)
+    ancestor = last - depth
+    assert deposits(run, 'invalid') == {deposit for deposit in orphaned if deposit[2] > ancestor}
+    assert len(deposits(run, 'invalid')) < len(orphaned)
+    assert run.tracker.last_processed_block == ancestor
+    assert run.tracker.processed_ranges.last_block() == ancestor
+    assert len(run.tracker.block_hashes) == 0
+
+    run.tick_until_caught_up()
+    assert run.tracker.last_processed_block == run.chain.head()
+    valid = {deposit[:2] for deposit in deposits(run, 'valid') if deposit[2] > ancestor}
+    assert valid == run.chain.canonical_deposits(ancestor + 1, run.chain.head())
+    assert run.rollups_consistent()
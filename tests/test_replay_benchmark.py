@@ -0,0 +1,26 @@
+import os
+import sys
+import argparse
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+pytest.importorskip('web3')
+
+import mysql.connector
+import ETH_Deposit_Tracker
+from Replay_Benchmark import Run
+
+
+def test_close_restores_the_tracker_module():
+    connect, mode, rpc = mysql.connector.connect, ETH_Deposit_Tracker.INGESTION_MODE, ETH_Deposit_Tracker.rpc
+    args = argparse.Namespace(seed=1, latency=0.0, mode='blocks', subscribers=0, send_latency=0.0)
+    run = Run('eth', args)
+    assert mysql.connector.connect == run.db.connect
+    assert ETH_Deposit_Tracker.INGESTION_MODE == 'blocks'
+    run.close()
+
+    assert mysql.connector.connect is connect
+    assert ETH_Deposit_Tracker.INGESTION_MODE == mode
+    assert ETH_Deposit_Tracker.rpc is rpc